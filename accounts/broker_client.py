@@ -0,0 +1,386 @@
+import json
+import threading
+import time
+import functools
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from fyers_apiv3 import fyersModel
+from fyers_apiv3.fyersModel import Config, FyersServiceSync
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPSConnectionPool
+
+from .constants import BrokerOrderStatusEnum
+from .token_provider import access_token_provider
+
+
+class BrokerClientMetrics:
+    """Counters for the client registry and its HTTP connection pool."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self.new_connections = 0
+        self.endpoints = {}
+
+    def record_client(self, is_hit):
+        with self.lock:
+            if is_hit:
+                self.pool_hits += 1
+            else:
+                self.pool_misses += 1
+
+    def record_connection(self):
+        with self.lock:
+            self.new_connections += 1
+
+    def record_call(self, api, elapsed):
+        with self.lock:
+            count, total, slowest = self.endpoints.get(api, (0, 0.0, 0.0))
+            self.endpoints[api] = (count + 1, total + elapsed, max(slowest, elapsed))
+
+    def snapshot(self):
+        """Returns the current counters, with per-endpoint call count and latency in milliseconds."""
+        with self.lock:
+            return {
+                "pool_hits": self.pool_hits,
+                "pool_misses": self.pool_misses,
+                "new_connections": self.new_connections,
+                "endpoints": {
+                    api: {"calls": count, "avg_ms": round(total / count * 1000, 2), "max_ms": round(slowest * 1000, 2)}
+                    for api, (count, total, slowest) in self.endpoints.items()
+                },
+            }
+
+
+broker_metrics = BrokerClientMetrics()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool that reports every new (not reused) connection."""
+
+    def _new_conn(self):
+        broker_metrics.record_connection()
+        return super()._new_conn()
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            **self.poolmanager.pool_classes_by_scheme,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = _PooledHTTPAdapter(pool_connections=4, pool_maxsize=settings.FYERS_HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    return session
+
+
+class PooledFyersService(FyersServiceSync):
+    """
+    Drop-in replacement for the SDK's synchronous service that sends every call through a
+    shared keep-alive `requests.Session` instead of a fresh connection per request.
+
+    Responses and error handling match `FyersServiceSync`: HTTP errors return the error
+    body, other failures return an error dict.
+    """
+
+    def __init__(self, logger, request_logger, session):
+        super().__init__(logger, request_logger)
+        self.session = session
+
+    def _call(self, method, api, header, url, body=None):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.session.request(
+                method,
+                url,
+                data=body,
+                headers={"Authorization": header, "Content-Type": self.content, "version": "3"},
+            )
+            self.request_logger.debug({"Status Code": response.status_code, "API": api})
+            response.raise_for_status()
+            return response.json()
+
+        except requests.HTTPError:
+            self.api_logger.error({"API": api, "Error": response.json()})
+            return response.json()
+
+        except Exception as e:
+            error_resp = dict(self.error_resp)
+            error_resp["code"] = response.status_code if response is not None else -99
+            self.api_logger.error({"API": api, "error": e})
+            return error_resp
+
+        finally:
+            broker_metrics.record_call(api, time.perf_counter() - started)
+
+    def post_call(self, api, header, data=None):
+        return self._call("POST", api, header, Config.API + api, json.dumps(data))
+
+    def get_call(self, api, header, data=None, data_flag=False):
+        url = (Config.DATA_API if data_flag else Config.API) + api
+        if data is not None:
+            url = url + "?" + urllib.parse.urlencode(data)
+        return self._call("GET", api, header, url)
+
+    def delete_call(self, api, header, data):
+        return self._call("DELETE", api, header, Config.API + api, json.dumps(data))
+
+    def patch_call(self, api, header, data):
+        return self._call("PATCH", api, header, Config.API + api, json.dumps(data))
+
+
+class FyersClientRegistry:
+    """
+    Hands out one shared `FyersModel` per (client_id, token).
+
+    All clients send their calls through one pooled HTTP session, so connections and TLS
+    sessions are reused across views and strategies. When the token rotates, clients of the
+    old token are dropped and the next lookup builds a client for the new one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = _build_session()
+        self._clients = {}
+
+    def get(self, token=None, client_id=None):
+        """
+        Returns the shared client for the token.
+
+        Args:
+            token (str, optional): Access token. Defaults to the current active token.
+            client_id (str, optional): Broker client id. Defaults to `FYERS_CLIENT_ID`.
+        """
+        client_id = client_id or settings.FYERS_CLIENT_ID
+        token = token if token is not None else access_token_provider.get()
+        key = (client_id, token)
+
+        with self.lock:
+            client = self._clients.get(key)
+            broker_metrics.record_client(client is not None)
+            if client is None:
+                # A new token for this client id replaces the clients of older tokens
+                for stale_key in [stale_key for stale_key in self._clients if stale_key[0] == client_id]:
+                    del self._clients[stale_key]
+
+                client = fyersModel.FyersModel(client_id=client_id, token=token, is_async=False, log_path="")
+                client.service = PooledFyersService(client.api_logger, client.request_logger, self.session)
+                self._clients[key] = client
+            return client
+
+
+fyers_client_registry = FyersClientRegistry()
+
+
+def get_fyers_client(access_token=None):
+    """Returns the shared Fyers client for the given token, or for the current active token."""
+    return fyers_client_registry.get(token=access_token)
+
+
+_broker_executor = None
+_broker_executor_lock = threading.Lock()
+
+
+def run_broker_calls(*calls):
+    """
+    Sends broker calls at the same time, so a group of them takes one round trip instead of one each.
+
+    Calls run on a process-wide thread pool with one worker per pooled HTTP connection.
+    They must not touch the database: the pool threads have no managed connection.
+
+    Args:
+        *calls: Callables without arguments, e.g. `functools.partial(fyers.place_order, data)`.
+
+    Returns:
+        list: One (result, exception) pair per call, in the order given; one of the two is None.
+    """
+    global _broker_executor
+    if len(calls) <= 1:
+        executor = None
+    else:
+        with _broker_executor_lock:
+            if _broker_executor is None:
+                _broker_executor = ThreadPoolExecutor(max_workers=settings.FYERS_HTTP_POOL_SIZE, thread_name_prefix="broker-call")
+            executor = _broker_executor
+
+    results = []
+    futures = [executor.submit(call) for call in calls] if executor else None
+    for index, call in enumerate(calls):
+        try:
+            results.append((futures[index].result() if futures else call(), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def rollback_orders(fyers, order_ids, logger):
+    """
+    Cancels orders the broker accepted but that were never recorded, because an order placed with them failed.
+
+    The cancels are sent together (see `run_broker_calls`). Orders that could not be cancelled
+    are logged as critical, to be cancelled by hand.
+
+    Args:
+        fyers: Fyers client.
+        order_ids (list): Broker order ids of the accepted orders.
+        logger: Logger of the strategy that placed the orders.
+
+    Returns:
+        list: The order ids that could not be cancelled.
+    """
+    failed = []
+    results = run_broker_calls(*[functools.partial(fyers.cancel_order, data={"id": order_id}) for order_id in order_ids])
+    for order_id, (response, error) in zip(order_ids, results):
+        if error is not None or not isinstance(response, dict) or response.get("s") != "ok":
+            logger.critical(f"Failed to roll back order {order_id}, cancel it manually: {error or response}")
+            failed.append(order_id)
+        else:
+            logger.warning(f"Rolled back order {order_id}.")
+    return failed
+
+
+# Most orders the broker accepts in one multi-order (basket) request
+BASKET_MAX_ORDERS = 10
+# Error codes with which the broker refuses a whole multi-order request without placing any of its orders
+BASKET_REJECTED_CODES = frozenset({-50, 400, 404, 405})
+
+
+def place_orders(fyers, orders):
+    """
+    Places several orders in as few round trips as possible.
+
+    With `FYERS_BASKET_ORDERS` on, the orders go out in multi-order requests of up to
+    `BASKET_MAX_ORDERS`, each order tagged with a unique `orderTag`. Only if the broker
+    rejects a request as a whole (`BASKET_REJECTED_CODES`) are its orders sent again as
+    concurrent single requests. Any other unexpected outcome may have placed some of the
+    orders, so they are never sent twice: the orderbook is searched for their tags
+    instead, and orders that cannot be found there are reported as failed.
+
+    Args:
+        fyers: Fyers client.
+        orders (list): Order data dicts as accepted by `place_order`.
+
+    Returns:
+        list: The `place_order` response of each order, in the order given.
+    """
+    if len(orders) <= 1 or not settings.FYERS_BASKET_ORDERS:
+        return _place_single_orders(fyers, orders)
+
+    responses = []
+    for start in range(0, len(orders), BASKET_MAX_ORDERS):
+        batch = [{"orderTag": uuid.uuid4().hex[:20], **order} for order in orders[start:start + BASKET_MAX_ORDERS]]
+        try:
+            response = fyers.place_basket_orders(batch)
+        except Exception as e:
+            response = {"s": "error", "code": -99, "message": str(e)}
+        results = response.get("data") if isinstance(response, dict) else None
+
+        if isinstance(results, list) and len(results) == len(batch):
+            responses.extend(
+                result.get("body") or {"s": "error", "message": result.get("statusDescription", "No response for order")}
+                for result in results
+            )
+        elif isinstance(response, dict) and response.get("code") in BASKET_REJECTED_CODES:
+            responses.extend(_place_single_orders(fyers, orders[start:start + BASKET_MAX_ORDERS]))
+        else:
+            responses.extend(_reconcile_basket_orders(fyers, batch, response))
+    return responses
+
+
+def _reconcile_basket_orders(fyers, batch, response):
+    """Returns the outcome of each order of a multi-order request with an unknown outcome, from the orderbook."""
+    try:
+        orderbook = fyers.orderbook()
+    except Exception as e:
+        orderbook = {"s": "error", "message": str(e)}
+    if not isinstance(orderbook, dict) or orderbook.get("s") != "ok":
+        message = f"Outcome unknown, check the orderbook: {response}"
+        return [{"s": "error", "message": message} for _ in batch]
+
+    by_tag = {}
+    for order in orderbook.get("orderBook") or []:
+        by_tag.setdefault(str(order.get("orderTag") or ""), order)
+
+    results = []
+    for order_data in batch:
+        # The broker may prefix the tag (e.g. "2:<tag>")
+        order = next((order for tag, order in by_tag.items() if tag.endswith(order_data["orderTag"])), None)
+        if order is None:
+            results.append({"s": "error", "message": f"Not found in the orderbook after: {response}"})
+        elif order.get("status") in (BrokerOrderStatusEnum.REJECTED.value, BrokerOrderStatusEnum.CANCELLED.value):
+            results.append({"s": "error", "id": order.get("id"), "message": order.get("message") or "Rejected"})
+        else:
+            results.append({"s": "ok", "id": order.get("id"), "message": "Found in the orderbook"})
+    return results
+
+
+def _place_single_orders(fyers, orders):
+    results = run_broker_calls(*[functools.partial(fyers.place_order, order) for order in orders])
+    return [response if error is None else {"s": "error", "message": str(error)} for response, error in results]
+
+
+def cancel_broker_orders(fyers, order_ids):
+    """
+    Cancels several orders in as few round trips as possible.
+
+    With `FYERS_BASKET_ORDERS` on, the orders are cancelled with multi-order requests of up to
+    `BASKET_MAX_ORDERS`; otherwise, or if the broker rejects a multi-order request as a whole,
+    with concurrent single requests. Cancelling an order twice is harmless, so requests with
+    an unknown outcome are retried as single requests too.
+
+    Args:
+        fyers: Fyers client.
+        order_ids (list): Broker order ids.
+
+    Returns:
+        list: (response, seconds until the response arrived) per order id, in the order given.
+    """
+    if len(order_ids) <= 1 or not settings.FYERS_BASKET_ORDERS:
+        return _cancel_single_orders(fyers, order_ids)
+
+    results = []
+    for start in range(0, len(order_ids), BASKET_MAX_ORDERS):
+        batch = order_ids[start:start + BASKET_MAX_ORDERS]
+        started = time.perf_counter()
+        try:
+            response = fyers.cancel_basket_orders(data=[{"id": order_id} for order_id in batch])
+        except Exception as e:
+            response = {"s": "error", "code": -99, "message": str(e)}
+        elapsed = time.perf_counter() - started
+        responses = response.get("data") if isinstance(response, dict) else None
+
+        if isinstance(responses, list) and len(responses) == len(batch):
+            results.extend((_basket_leg_response(result), elapsed) for result in responses)
+        else:
+            results.extend(_cancel_single_orders(fyers, batch))
+    return results
+
+
+def _basket_leg_response(result):
+    """Returns the response of one leg of a multi-order request, or an error response if it has none."""
+    body = result.get("body") if isinstance(result, dict) else None
+    if isinstance(body, dict):
+        return body
+    message = result.get("statusDescription", "No response for order") if isinstance(result, dict) else "No response for order"
+    return {"s": "error", "message": message}
+
+
+def _cancel_single_orders(fyers, order_ids):
+    def timed_cancel(order_id):
+        started = time.perf_counter()
+        response = fyers.cancel_order(data={"id": order_id})
+        return response, time.perf_counter() - started
+
+    results = run_broker_calls(*[functools.partial(timed_cancel, order_id) for order_id in order_ids])
+    return [result if error is None else ({"s": "error", "message": str(error)}, None) for result, error in results]
@@ -35,4 +35,24 @@ class TransactionTypeEnum(Enum):
 
 class OrderRoleEnum(Enum):
     ENTRY = 'entry'
-    EXIT = 'exit'
\ No newline at end of file
+    EXIT = 'exit'
+
+class BrokerOrderStatusEnum(Enum):
+    """Order status codes reported by the Fyers order websocket and orderbook."""
+    CANCELLED = 1
+    TRADED = 2
+    TRANSIT = 4
+    REJECTED = 5
+    PENDING = 6
+
+class StrategyStateEnum(Enum):
+    INITIAL_ENTRY = 'initial_entry'
+    LADDER_ARMED = 'ladder_armed'
+    ENTRY_FILLED = 'entry_filled'
+    EXIT_FILLED = 'exit_filled'
+    ROLLOVER = 'rollover'
+    STOPPED = 'stopped'
+
+class PriceQuantityTableTypeEnum(Enum):
+    LADDER = 'ladder'
+    BUY_SELL = 'buy_sell'
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+from accounts.constants import BrokerOrderStatusEnum
+
+
+class FillPriceCache:
+    """
+    Traded prices of recent fills, keyed by broker order id, fed from the order websocket.
+
+    A fully traded `OnOrders` update carries the average traded price of the order and is
+    authoritative. `OnTrades` updates are combined into a quantity weighted average until
+    that update arrives, which is final once the traded quantity reaches the order quantity.
+    Reading a price does not consume it; only the last `max_orders` orders are kept.
+    """
+
+    def __init__(self, max_orders=1000):
+        self.max_orders = max_orders
+        self.lock = threading.Lock()
+        self.updated = threading.Condition(self.lock)
+        self._prices = OrderedDict()  # order id -> (traded price, True once the order update arrived)
+        self._trades = OrderedDict()  # order id -> (traded quantity, traded value, trade numbers)
+
+    def record_order(self, message):
+        """Records the traded price of a parsed `OnOrders` message of a fully traded order."""
+        if not message or message.get("s") != "ok":
+            return
+        order = message.get("orders") or {}
+        order_id = order.get("id")
+        price = order.get("tradedPrice")
+        if not order_id or order.get("status") != BrokerOrderStatusEnum.TRADED.value or price in (None, ""):
+            return
+
+        with self.lock:
+            self._trades.pop(order_id, None)
+            self._store(order_id, float(price), final=True)
+
+    def record_trade(self, message):
+        """Adds a parsed `OnTrades` message to the average traded price of its order."""
+        if not message or message.get("s") != "ok":
+            return
+        trade = message.get("trades") or {}
+        order_id = trade.get("orderNumber")
+        price, quantity = trade.get("tradePrice"), trade.get("tradedQty")
+        if not order_id or price in (None, "") or not quantity:
+            return
+
+        with self.lock:
+            if self._prices.get(order_id, (None, False))[1]:
+                return
+            quantity_total, value_total, trade_numbers = self._trades.pop(order_id, (0.0, 0.0, frozenset()))
+            if trade.get("tradeNumber") not in trade_numbers:
+                quantity_total += float(quantity)
+                value_total += float(quantity) * float(price)
+                trade_numbers = trade_numbers | {trade.get("tradeNumber")}
+            self._trades[order_id] = (quantity_total, value_total, trade_numbers)
+            while len(self._trades) > self.max_orders:
+                self._trades.popitem(last=False)
+            self._store(order_id, value_total / quantity_total, final=False)
+
+    def get(self, order_id, timeout=0, quantity=None):
+        """
+        Returns the final traded price of an order.
+
+        A price is final once the order update reports the order fully traded, or once the
+        trades received add up to `quantity`. The average of a partial fill is never returned.
+
+        Args:
+            order_id (str): Broker order id.
+            timeout (float): Seconds to wait for the fill if it has not completed yet.
+            quantity (int, optional): Order quantity, so a fill complete on the trade updates
+                                      does not have to wait for the order update.
+
+        Returns:
+            float or None: The traded price, or None if the order was not fully filled in time.
+        """
+        with self.lock:
+            if self.updated.wait_for(lambda: self._is_final(order_id, quantity), timeout):
+                return self._prices[order_id][0]
+            return None
+
+    def _is_final(self, order_id, quantity):
+        """Caller must hold the lock."""
+        price, final = self._prices.get(order_id, (None, False))
+        if final:
+            return True
+        return price is not None and bool(quantity) and self._trades.get(order_id, (0.0,))[0] >= float(quantity)
+
+    def _store(self, order_id, price, final):
+        """Caller must hold the lock."""
+        self._prices[order_id] = (price, final)
+        self._prices.move_to_end(order_id)
+        while len(self._prices) > self.max_orders:
+            self._prices.popitem(last=False)
+        self.updated.notify_all()
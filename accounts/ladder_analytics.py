@@ -0,0 +1,77 @@
+import numpy as np
+
+
+def _column(levels, field):
+    return np.array([getattr(level, field) if getattr(level, field) is not None else np.nan for level in levels], dtype=np.float64)
+
+
+class LadderAnalytics:
+    """
+    Derived columns of a ladder, computed once with NumPy from its levels.
+
+    Levels are taken in the order given (by level number), each buying `main_quantity` at
+    `main_percentage` and selling at `main_target`. Missing quantities count as 0 and
+    missing prices as NaN.
+
+    Attributes:
+        amounts: Cost of each level (price x quantity).
+        cum_quantity, cum_amount: Position and cost held once the ladder reached each level.
+        breakeven: Average price of the position held at each level.
+        drawdown: Largest mark-to-market loss of the position on the way down to each level.
+        payoff_at_target: Profit of each level when it exits at its target.
+        hedging_cum_quantity: Hedge quantity held once the ladder reached each level.
+    """
+    __slots__ = (
+        "level_ids", "level_numbers", "prices", "quantities", "targets", "hedging_quantities",
+        "amounts", "cum_quantity", "cum_amount", "breakeven", "drawdown", "payoff_at_target",
+        "hedging_cum_quantity",
+    )
+
+    def __init__(self, levels):
+        self.level_ids = np.array([level.id for level in levels], dtype=np.int64)
+        self.level_numbers = np.array([level.level_number for level in levels], dtype=np.int64)
+        self.prices = _column(levels, 'main_percentage')
+        self.quantities = np.nan_to_num(_column(levels, 'main_quantity'))
+        self.targets = _column(levels, 'main_target')
+        self.hedging_quantities = np.nan_to_num(_column(levels, 'hedging_quantity'))
+
+        self.amounts = self.prices * self.quantities
+        self.cum_quantity = np.cumsum(self.quantities)
+        self.cum_amount = np.cumsum(self.amounts)
+        self.breakeven = np.divide(
+            self.cum_amount, self.cum_quantity, out=np.full(len(levels), np.nan), where=self.cum_quantity != 0
+        )
+        # Loss of everything bought so far, marked at each level's own price
+        loss_at_level = self.cum_amount - self.prices * self.cum_quantity
+        self.drawdown = np.maximum.accumulate(np.clip(loss_at_level, 0, None)) if len(levels) else loss_at_level
+        self.payoff_at_target = (self.targets - self.prices) * self.quantities
+        self.hedging_cum_quantity = np.cumsum(self.hedging_quantities)
+
+    def __len__(self):
+        return len(self.level_ids)
+
+    def index_of(self, level_number):
+        """Returns the row of the level with the given number, or None if it is not in the ladder."""
+        index = int(np.searchsorted(self.level_numbers, level_number))
+        if index < len(self.level_numbers) and self.level_numbers[index] == level_number:
+            return index
+        return None
+
+    def pnl(self, price):
+        """
+        Returns the P&L of each level and the running cumulative P&L at a market price.
+
+        Args:
+            price (float): Current price of the main instrument.
+
+        Returns:
+            tuple: (pnl, cumulative pnl) arrays.
+        """
+        pnl = (price - self.prices) * self.quantities
+        return pnl, np.cumsum(pnl)
+
+    @staticmethod
+    def to_list(values, decimals=3):
+        """Rounds an array for JSON output, with NaN as None and whole numbers as int if decimals is 0."""
+        cast = int if decimals == 0 else float
+        return [None if np.isnan(value) else cast(value) for value in np.round(values, decimals).tolist()]
@@ -0,0 +1,157 @@
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from accounts.ladder_analytics import LadderAnalytics
+from accounts.models import OrderLevel
+
+
+class LevelRecord:
+    """Read-only snapshot of an `OrderLevel` row used by the strategy engine."""
+    __slots__ = (
+        "id", "strategy_id", "level_number", "main_percentage", "main_quantity", "main_target",
+        "hedging_quantity", "hedging_limit_price", "hedging_limit_quantity", "is_skip",
+    )
+
+    def __init__(self, level):
+        for field in self.__slots__:
+            setattr(self, field, getattr(level, field))
+
+    def __str__(self):
+        return f"Level {self.level_number} | {self.main_percentage} | {self.strategy_id}"
+
+    __repr__ = __str__
+
+
+class LevelLadder:
+    """All levels of a strategy, indexed by level number."""
+    __slots__ = ("instrument", "levels", "levels_length", "_analytics")
+
+    def __init__(self, instrument, levels):
+        if not levels:
+            raise ValueError("No levels found for the strategy.")
+
+        self.instrument = instrument
+        self.levels_length = max(level.level_number for level in levels)
+        self.levels = [None] * (self.levels_length + 1)
+        for level in levels:
+            self.levels[level.level_number] = LevelRecord(level)
+        self._analytics = None
+
+    @property
+    def analytics(self):
+        """`LadderAnalytics` of the ladder, computed on first use and kept with the cached ladder."""
+        if self._analytics is None:
+            self._analytics = LadderAnalytics([level for level in self.levels if level is not None])
+        return self._analytics
+
+    def get(self, level_number):
+        """Returns the level with the given number, or None if it does not exist."""
+        if 0 <= level_number <= self.levels_length:
+            return self.levels[level_number]
+        return None
+
+
+class LadderCache:
+    """
+    Process-wide cache of strategy ladders, keyed by strategy id.
+
+    A ladder is loaded from the database once and served from memory until the levels of
+    the strategy are rewritten (`create_table`) or edited (`HomeView.post`), which must call
+    `invalidate`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._ladders = {}
+        self._generations = {}
+
+    def get(self, strategy, instrument):
+        """Returns the cached ladder of the strategy, loading it if missing or built for another instrument."""
+        with self.lock:
+            ladder = self._ladders.get(strategy.id)
+            generation = self._generations.get(strategy.id, 0)
+        if ladder is not None and ladder.instrument == instrument:
+            return ladder
+
+        # Load outside the lock so one strategy's query never blocks the others
+        levels = OrderLevel.objects.filter(strategy=strategy, strategy__main_instrument=instrument).order_by('level_number')
+        ladder = LevelLadder(instrument, list(levels))
+
+        with self.lock:
+            # Don't store a ladder that was invalidated while it was being loaded
+            if self._generations.get(strategy.id, 0) == generation:
+                self._ladders[strategy.id] = ladder
+        return ladder
+
+    def invalidate(self, strategy_id):
+        """Drops the cached ladder of the strategy so the next lookup reloads it."""
+        with self.lock:
+            self._ladders.pop(strategy_id, None)
+            self._generations[strategy_id] = self._generations.get(strategy_id, 0) + 1
+
+
+class StaticLadderCache:
+    """
+    Shared (Django cache) store of the static dashboard rows of each strategy.
+
+    Rows are stored per ladder version. Every strategy has a version token in the cache
+    that `invalidate` replaces whenever its levels are rewritten or edited, so rows built
+    from an older version are never served again, even if they were written after the
+    invalidation. Rows are only rebuilt when the ladder actually changes.
+    """
+
+    @staticmethod
+    def _version_key(strategy_id):
+        return f"static_ladder_version_{strategy_id}"
+
+    @staticmethod
+    def _rows_key(strategy_id, version):
+        return f"static_ladder_{strategy_id}_{version}"
+
+    def get_many(self, strategy_ids, build):
+        """
+        Returns the static data of the strategies, building only the missing ones.
+
+        Args:
+            strategy_ids (list): Strategy ids.
+            build (callable): Called with the list of ids missing from the cache, returns a
+                              dict of strategy id to static data for the ones that exist.
+
+        Returns:
+            dict: Strategy id to static data.
+        """
+        versions = self._versions(strategy_ids)
+        rows_keys = {self._rows_key(strategy_id, version): strategy_id for strategy_id, version in versions.items()}
+        cached = cache.get_many(rows_keys.keys())
+        static_data = {rows_keys[key]: data for key, data in cached.items()}
+
+        missing = [strategy_id for strategy_id in strategy_ids if strategy_id not in static_data]
+        if missing:
+            built = build(missing)
+            cache.set_many(
+                {self._rows_key(strategy_id, versions[strategy_id]): data for strategy_id, data in built.items()},
+                timeout=settings.STATIC_LADDER_CACHE_TIMEOUT,
+            )
+            static_data.update(built)
+        return static_data
+
+    def invalidate(self, strategy_id):
+        """Moves the strategy to a new ladder version so its cached rows are rebuilt on the next read."""
+        cache.set(self._version_key(strategy_id), uuid.uuid4().hex, timeout=None)
+
+    def _versions(self, strategy_ids):
+        keys = {self._version_key(strategy_id): strategy_id for strategy_id in strategy_ids}
+        versions = {keys[key]: version for key, version in cache.get_many(keys.keys()).items()}
+        for strategy_id in strategy_ids:
+            if strategy_id not in versions:
+                # `add` keeps a version another process created meanwhile
+                cache.add(self._version_key(strategy_id), uuid.uuid4().hex, timeout=None)
+                versions[strategy_id] = cache.get(self._version_key(strategy_id))
+        return versions
+
+
+ladder_cache = LadderCache()
+static_ladder_cache = StaticLadderCache()
@@ -0,0 +1,73 @@
+import queue
+import threading
+
+
+class LiveUpdateSubscription:
+    """Events of a set of strategies queued for one streaming client."""
+    __slots__ = ("strategy_ids", "events")
+
+    def __init__(self, strategy_ids, max_pending):
+        self.strategy_ids = frozenset(strategy_ids)
+        self.events = queue.Queue(maxsize=max_pending)
+
+    def get(self, timeout):
+        """Returns the next event, or None if none arrived within the timeout."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Returns all events queued right now without waiting."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class LiveUpdateBus:
+    """
+    In-process publish/subscribe bus between the strategy engine and the dashboard stream.
+
+    The engine publishes order and state changes of a strategy; every streaming client
+    subscribed to that strategy receives them. Publishing never blocks the engine: a
+    client that stops reading loses events once `max_pending` of them are queued.
+    """
+
+    def __init__(self, max_pending=100):
+        self.lock = threading.Lock()
+        self.max_pending = max_pending
+        self._subscriptions = set()
+
+    def subscribe(self, strategy_ids):
+        subscription = LiveUpdateSubscription(strategy_ids, self.max_pending)
+        with self.lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, strategy_id, event, data):
+        """
+        Sends an event to every client subscribed to the strategy.
+
+        Args:
+            strategy_id (int): Strategy the event belongs to.
+            event (str): Event name, e.g. "state" or "order".
+            data (dict): JSON serialisable event payload.
+        """
+        message = {"id": strategy_id, "event": event, "data": data}
+        with self.lock:
+            subscriptions = [subscription for subscription in self._subscriptions if strategy_id in subscription.strategy_ids]
+        for subscription in subscriptions:
+            try:
+                subscription.events.put_nowait(message)
+            except queue.Full:
+                pass
+
+
+live_updates = LiveUpdateBus()
@@ -1,24 +1,54 @@
-import queue
+import functools
 import threading
 import time
+from collections import Counter, deque
 from datetime import datetime
 
+import numpy as np
 import requests
 from django.conf import settings
-from django.db.models import Q
-from fyers_apiv3 import fyersModel
 
-from accounts.constants import OrderTypeEnum, TransactionTypeEnum, OrderRoleEnum
+from accounts.broker_client import cancel_broker_orders, get_fyers_client, place_orders, rollback_orders, run_broker_calls
+from accounts.constants import BrokerOrderStatusEnum, OrderTypeEnum, TransactionTypeEnum, OrderRoleEnum, StrategyStateEnum
 from accounts.logging_setup import get_strategy_logger
-from accounts.models import Orders, OrderLevel
+from accounts.level_ladder import ladder_cache
+from accounts.live_updates import live_updates
+from accounts.models import Orders
+from accounts.order_book import OpenOrderBook
 from accounts.utils import get_instrument, create_table, OrderPlacementError, retry_on_exception
-from accounts.websocket_handler import FyersWebSocketManager
+from accounts.order_stream import OrderStreamHub
 
 
 class TradingStrategy1:
-    lock = threading.Lock()
-
-    def __init__(self, strategy_parameters):
+    """
+    Ladder trading strategy running on its own thread.
+
+    Lock hierarchy (always acquire top to bottom, never the reverse):
+        1. StrategyManager.lock - registry of running strategies.
+        2. TradingStrategy1.lock - one per strategy instance, guards its order bookkeeping
+           and level state. Strategies never share it, so fills of different strategies
+           are handled in parallel.
+        3. Leaf locks of shared components (LadderCache, OrderStreamHub, OrderDispatcher,
+           OpenOrderBook).
+           These only guard in-memory maps and are never held while acquiring another lock.
+
+    No per-order locks are needed: every order of a strategy is placed, filled and cancelled
+    on that strategy's own thread.
+
+    Open orders are tracked in `order_book`, loaded once at start; the order journal itself is
+    started by `StrategyManager`, once per process. Fill and cancel handling
+    only reads the book; changed rows are journaled once the next orders are armed
+    (`_flush_orders`) and written to `Orders` by the journal's background writer.
+    """
+
+    def __init__(self, strategy_parameters, fyers=None, order_dispatcher=None):
+        """
+        Args:
+            strategy_parameters (dict): Strategy settings; see `required_params`.
+            fyers (optional): Broker client to use instead of one built from the access token.
+            order_dispatcher (OrderDispatcher, optional): Dispatcher to wait on fills with instead
+                of subscribing to the shared order stream.
+        """
 
         # Validate required parameters
         required_params = ["strategy", "target", "hedging_limit_price", "access_token", "index", "expiry"]
@@ -46,26 +76,129 @@ class TradingStrategy1:
 
         # Strategy configurations
         self.stop_event = threading.Event()
+        self.lock = threading.Lock()
         self.current_level_index = 0  # Start at the first level
-        self.ws_client = FyersWebSocketManager(self.access_token, self.logger)
-        self.ws_client.start()
+        self.order_stream = OrderStreamHub()
+        self.order_stream_key = f"strategy-{self.strategy.id}"
+        self.order_dispatcher = order_dispatcher or self.order_stream.subscribe(self.order_stream_key, self.access_token)
+        self.fill_prices = self.order_stream.fill_prices
+        self.order_book = OpenOrderBook(self.strategy.id)
         self.current_level = None
         self.previous_level = None
         self.next_level = None
         self.levels_length = None
-        self.fyers = fyersModel.FyersModel(client_id=settings.FYERS_CLIENT_ID, token=self.access_token, is_async=False, log_path="")
+        self.ladder = None
+        self.entry_order_id = None
+        self.exit_order_id = None
+        self.state = None
+        self.transition_count = 0
+        self.transition_counts = Counter()
+        self.exit_filled_at = None
+        self.rollover_started_at = None
+        self.rollover_latencies = deque(maxlen=100)  # Seconds from exit fill to the new ladder being armed
+        self.cancel_latencies = deque(maxlen=500)  # Seconds per order cancelled by a bulk cancel
+        self.last_bulk_cancel = None
+        self.fyers = fyers or get_fyers_client(self.access_token)
         self.is_active = self.strategy.is_active
 
     def run_strategy(self):
-        """Starts the strategy."""
+        """
+        Starts the strategy and drives it through its states until it stops.
+
+        Every level crossing is one iteration of this loop rather than a nested call, so the
+        stack depth stays constant no matter how many levels are traded in a day.
+        """
         self.logger.info(f"Strategy started for strategy id: {self.strategy.id}")
+        state_handlers = {
+            StrategyStateEnum.INITIAL_ENTRY: self._on_initial_entry,
+            StrategyStateEnum.LADDER_ARMED: self.process_next_level,
+            StrategyStateEnum.ENTRY_FILLED: self._handle_entry_order,
+            StrategyStateEnum.EXIT_FILLED: self._handle_exit_order,
+            StrategyStateEnum.ROLLOVER: self._execute_exit_strategy,
+        }
+
+        try:
+            self.logger.info(f"Loaded {self.order_book.load()} open orders into the order book.")
+            self.state = StrategyStateEnum.INITIAL_ENTRY
+        except Exception as e:
+            self.logger.exception(f"Failed to load the open orders: {e}")
+            self.state = StrategyStateEnum.STOPPED
+
+        while self.state != StrategyStateEnum.STOPPED:
+            if self.stop_event.is_set() or not self.is_active:
+                next_state = StrategyStateEnum.STOPPED
+            else:
+                try:
+                    next_state = state_handlers[self.state]()
+                except Exception as e:
+                    self.logger.exception(f"Unexpected error in state {self.state.value}: {e}")
+                    next_state = StrategyStateEnum.STOPPED
+
+            self._record_transition(self.state, next_state)
+            self.state = next_state
+
+        if not self.stop_event.is_set():
+            self.stop_strategy()
+
+    def _record_transition(self, from_state, to_state):
+        """Counts a state transition for the strategy metrics and pushes it to live dashboards."""
+        self.transition_count += 1
+        self.transition_counts[(from_state.value, to_state.value)] += 1
+        self.logger.debug(f"State transition #{self.transition_count}: {from_state.value} -> {to_state.value}")
+        live_updates.publish(self.strategy.id, 'state', {
+            'from': from_state.value, 'to': to_state.value, 'level': self.current_level_index,
+        })
+
+    def _record_rollover_latency(self):
+        """Records the time from the exit fill that triggered the rollover to the new ladder being armed."""
+        latency = time.perf_counter() - self.rollover_started_at
+        self.rollover_started_at = None
+        self.rollover_latencies.append(latency)
+        self.logger.info(f"Rollover latency (exit fill -> new ladder armed): {latency * 1000:.1f} ms")
+
+    def rollover_latency_stats(self):
+        """Returns the last, average and max rollover latency in milliseconds, or None before the first rollover."""
+        latencies = list(self.rollover_latencies)
+        if not latencies:
+            return None
+        return {
+            "last_ms": round(latencies[-1] * 1000, 1),
+            "avg_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+            "count": len(latencies),
+        }
+
+    def _record_cancel_latencies(self, latencies, elapsed, failed=0):
+        """Records the latencies of the successful cancels of one bulk cancel and logs their percentiles."""
+        latencies = [latency for latency in latencies if latency is not None]
+        self.cancel_latencies.extend(latencies)
+        self.last_bulk_cancel = {
+            "orders": len(latencies), "failed": failed, "total_ms": round(elapsed * 1000, 1), **self._latency_percentiles(latencies),
+        }
+        self.logger.info(f"Bulk cancel{' during rollover' if self.rollover_started_at is not None else ''}: {self.last_bulk_cancel}")
 
+    @staticmethod
+    def _latency_percentiles(latencies):
+        """Returns the p50, p90, p99 and max of latencies in seconds, in milliseconds."""
+        if not latencies:
+            return {}
+        p50, p90, p99 = (np.percentile(latencies, [50, 90, 99]) * 1000).tolist()
+        return {"p50_ms": round(p50, 1), "p90_ms": round(p90, 1), "p99_ms": round(p99, 1), "max_ms": round(max(latencies) * 1000, 1)}
+
+    def cancel_latency_stats(self):
+        """Returns the percentiles of the last bulk cancel and of the recent ones, or None before the first bulk cancel."""
+        if self.last_bulk_cancel is None:
+            return None
+        return {"last": self.last_bulk_cancel, "recent": self._latency_percentiles(list(self.cancel_latencies))}
+
+    def _on_initial_entry(self):
+        """Loads the ladder and places the initial market order for the first level."""
         # Fetch levels needed for the strategy
         try:
             self.fetch_levels()
         except Exception as e:
-            self.stop_strategy()
-            return  # Stop further execution
+            self.logger.error(f"Failed to fetch levels: {e}")
+            return StrategyStateEnum.STOPPED
 
         # Place the initial market order
         try:
@@ -73,24 +206,17 @@ class TradingStrategy1:
             self.logger.info("Initial market order placed successfully.")
         except Exception as e:
             self.logger.error(f"Initial market order failed: {e}")
-            self.stop_strategy()
-            return  # Stop further execution
+            return StrategyStateEnum.STOPPED
 
-        # Process subsequent levels
-        try:
-            self.logger.info(f"Processing next Level Index: {self.current_level_index}")
-            self.process_next_level()
-        except Exception as e:
-            self.logger.error(f"Error while processing next level: {e}")
-            self.stop_strategy()
+        self.logger.info(f"Processing next Level Index: {self.current_level_index}")
+        return StrategyStateEnum.LADDER_ARMED
 
     def process_next_level(self):
-        """Processes the next level in the strategy."""
+        """Arms the orders around the current level and waits for one of them to fill."""
         try:
             if self.current_level_index >= self.levels_length:
                 self.logger.info("All levels processed. Stopping strategy.")
-                self.stop_strategy()
-                return
+                return StrategyStateEnum.STOPPED
 
             # Fetch levels for the current index
             self.fetch_levels(self.current_level_index)
@@ -99,30 +225,32 @@ class TradingStrategy1:
                 f"Current: {self.current_level}, Previous: {self.previous_level}, Next: {self.next_level}"
             )
 
-            # Process current level
-            order_role_current, current_level_order = self._process_level(
-                level=self.current_level,
-                strategy=self.strategy,
-                is_previous_level=False,
-                is_main=True
-            )
+            if not self._within_risk_limits(self.next_level):
+                return StrategyStateEnum.STOPPED
 
-            # Process next level
-            order_role_next, next_level_order = self._process_level(
-                level=self.next_level,
-                strategy=self.strategy,
-                is_previous_level=True,
-                is_main=True
-            )
+            # Place the current and next level orders together, arming the bracket in one round trip
+            (order_role_current, current_level_order), (order_role_next, next_level_order) = self._place_level_orders([
+                (self.current_level, False),
+                (self.next_level, True),
+            ])
 
             orders_table = {"Order Placed for level": self.current_level_index, "Entry Order": next_level_order, "Exit Order": current_level_order}
             self.logger.info(orders_table)
 
-            entry_order_id = next_level_order if order_role_next == OrderRoleEnum.ENTRY.value else current_level_order
-            exit_order_id = current_level_order if order_role_current == OrderRoleEnum.EXIT.value else next_level_order
+            self.entry_order_id = next_level_order if order_role_next == OrderRoleEnum.ENTRY.value else current_level_order
+            self.exit_order_id = current_level_order if order_role_current == OrderRoleEnum.EXIT.value else next_level_order
+            if self.rollover_started_at is not None:
+                self._record_rollover_latency()
+
+            # Both orders are armed; persist the changes while waiting for a fill
+            self._flush_orders()
 
             # Wait for confirmation of the orders
-            self.wait_for_order_confirmation(entry_order_id, exit_order_id)
+            order_type = self.wait_for_order_confirmation(self.entry_order_id, self.exit_order_id)
+            if order_type == OrderRoleEnum.ENTRY.value:
+                return StrategyStateEnum.ENTRY_FILLED
+            if order_type == OrderRoleEnum.EXIT.value:
+                return StrategyStateEnum.EXIT_FILLED
 
         except ValueError as ve:
             self.logger.error(f"Configuration error at level {self.current_level_index}: {ve}")
@@ -131,216 +259,224 @@ class TradingStrategy1:
         except Exception as e:
             self.logger.exception(f"Unexpected error processing level {self.current_level_index}: {e}")
 
-    def _process_level(self, level, strategy, is_previous_level, is_main=False):
+        return StrategyStateEnum.STOPPED
+
+    def _flush_orders(self):
+        """Journals the order book changes, keeping them for the next flush if the journal write fails."""
+        try:
+            written = self.order_book.flush()
+            if written:
+                self.logger.debug(f"Flushed {written} order changes.")
+        except Exception as e:
+            self.logger.error(f"Failed to persist order changes, will retry on the next flush: {e}")
+
+    def _within_risk_limits(self, level):
+        """
+        Checks that arming the entry of the level keeps the ladder within `LADDER_MAX_DRAWDOWN`.
+
+        Returns:
+            bool: False if the drawdown of the position held at the level would exceed the limit.
+        """
+        if not settings.LADDER_MAX_DRAWDOWN or level is None:
+            return True
+
+        analytics = self.ladder.analytics
+        index = analytics.index_of(level.level_number)
+        if index is None:
+            return True
+
+        drawdown = float(analytics.drawdown[index])
+        if drawdown > settings.LADDER_MAX_DRAWDOWN:
+            self.logger.warning(
+                f"Risk limit reached at level {level.level_number}: drawdown {drawdown:.2f} > {settings.LADDER_MAX_DRAWDOWN} "
+                f"(breakeven {analytics.breakeven[index]:.2f}, position {analytics.cum_quantity[index]:.0f})"
+            )
+            return False
+        return True
+
+    def _level_order_role(self, level, is_previous_level, is_main=False):
         """
-        Processes a single level and places the corresponding order.
+        Decides whether the order of a level exits the position open at it or enters a new one.
 
         Args:
             level: The level to process.
-            strategy: The current strategy.
             is_previous_level: Whether this is a previous level or the current level.
 
         Returns:
-            The placed order details.
+            tuple: (order role, transaction type) of the order to place.
+        """
+        if not level:
+            raise ValueError("Level information is required.")
 
-        Raises:
-            Exception: If an unexpected error occurs during order placement.
+        if self.order_book.open_position(level.id, is_main=is_main):
+            self.logger.debug(f"Placing exit order for {'previous' if is_previous_level else 'current'} level: {level}")
+            return OrderRoleEnum.EXIT.value, TransactionTypeEnum.SELL.value
+
+        self.logger.debug(f"Placing entry order for {'next' if is_previous_level else 'current'} level: {level}")
+        return OrderRoleEnum.ENTRY.value, TransactionTypeEnum.BUY.value
+
+    def _place_level_orders(self, levels):
         """
-        try:
-            order = Orders.objects.filter(entry_order_id__isnull=False, exit_order_id__isnull=True, level=level, level__strategy=strategy, is_complete=False, is_main=is_main).first()
+        Places the limit orders of several levels concurrently and records them once all are accepted.
 
-            if order:
-                transaction_type = TransactionTypeEnum.SELL.value
-                order_role = OrderRoleEnum.EXIT.value
-                self.logger.debug(f"Placing exit order for {'previous' if is_previous_level else 'current'} level: {level}")
-            else:
-                transaction_type = TransactionTypeEnum.BUY.value
-                order_role = OrderRoleEnum.ENTRY.value
-                self.logger.debug(f"Placing entry order for {'next' if is_previous_level else 'current'} level: {level}")
+        If any order is rejected, the accepted ones are cancelled again so the ladder is never
+        left half armed.
+
+        Args:
+            levels (list): (level, is_previous_level) pairs.
+
+        Returns:
+            list: (order role, order id) per level, in the order given.
 
-            return order_role, self._place_and_process_order(
+        Raises:
+            OrderPlacementError: If any of the orders could not be placed.
+        """
+        roles = [self._level_order_role(level, is_previous_level, is_main=True) for level, is_previous_level in levels]
+        results = run_broker_calls(*[
+            functools.partial(
+                self.place_order,
                 order_type=OrderTypeEnum.LIMIT_ORDER.value,
-                side=transaction_type,
+                side=side,
                 order_role=order_role,
                 level=level,
                 is_hedging_order=False,
             )
-        except Exception as e:
-            self.logger.exception(f"Error processing {'previous' if is_previous_level else 'current'} level: {level} | {e}")
-            raise
-
-    def _process_order(self, entry_order, exit_order, status, order_type):
-        """Processes the order confirmation based on its type."""
-        if status == 'ok':
-            if order_type == "entry":
-                self._handle_entry_order({}, entry_order, exit_order, status)
-            elif order_type == "exit":
-                self._handle_exit_order({}, entry_order, exit_order, status)
-        else:
-            self.logger.error(f"{order_type} order failed with status: {status}")
+            for (level, _), (order_role, side) in zip(levels, roles)
+        ])
+
+        order_ids, errors = [], []
+        for (level, is_previous_level), (result, error) in zip(levels, results):
+            order_id = None
+            if error is None:
+                try:
+                    order_id = self._accepted_order_id(result[0])
+                except RuntimeError as e:
+                    error = e
+            if error is not None:
+                self.logger.error(f"Error processing {'previous' if is_previous_level else 'current'} level: {level} | {error}")
+                errors.append(f"level {level.level_number}: {error}")
+            order_ids.append(order_id)
+
+        if errors:
+            accepted = [order_id for order_id in order_ids if order_id]
+            self.order_dispatcher.discard(*accepted)
+            rollback_orders(self.fyers, accepted, self.logger)
+            raise OrderPlacementError("; ".join(errors), order_details=levels)
+
+        for (level, _), (order_role, _), ((_, price, quantity), _), order_id in zip(levels, roles, results, order_ids):
+            self._handle_order_response(order_id, order_role, level, price, quantity, OrderTypeEnum.LIMIT_ORDER.value)
+        return [(order_role, order_id) for (order_role, _), order_id in zip(roles, order_ids)]
 
     def wait_for_order_confirmation(self, entry_order_id, exit_order_id):
-        """Wait until the status of the specified orders is confirmed."""
-
-        while not self.stop_event.is_set():
-            try:
-                # Retrieve message from the queue
-                order_info = self._get_message_from_queue(entry_order_id, exit_order_id)
-                if order_info:
-                    order_id, status, order_type = order_info
-
-                    self.logger.info(
-                        f"Order confirmed: order_id={order_id}, status={status}, type={order_type}"
-                    )
-                    self._process_order(entry_order_id, exit_order_id, status, order_type)
-                    break  # Exit loop after processing the relevant order
-
-            except queue.Empty:
-                self.logger.debug("Queue timeout while waiting for message.")
-            except Exception as e:
-                self.logger.error(f"Unexpected error while retrieving or processing message: {e}")
-            finally:
-                time.sleep(0.1)  # Prevent high CPU usage during polling
-
-    def _get_message_from_queue(self, entry_order, exit_order):
         """
-        Helper function to retrieve and identify a message for the specified orders.
-
-        Args:
-            entry_order (str): Order ID for the entry order.
-            exit_order (str): Order ID for the exit order.
+        Wait until one of the specified orders is filled.
 
         Returns:
-            tuple: A tuple (order_id, status, order_type), where `order_type` is either
-                   "entry" or "exit". Returns None if no matching message is found.
+            str or None: "entry" or "exit" for the order that filled, or None if the
+                         strategy was stopped while waiting.
         """
-        try:
-            # Fetch message from the queue with a timeout
-            message = self.ws_client.q.get(timeout=1)
-
-            # Validate and parse the message structure
-            if message.get("s") != "ok":
-                self.logger.warning(f"Invalid WebSocket message status: {message.get('s')}")
-                return None
-
-            # Extract order details
-            orders = message.get("orders", {})
-            order_id = orders.get("id")
-            status = message.get("s")  # This corresponds to the order status
-
-            # Determine if the message matches the entry or exit order
-            if order_id == entry_order:
-                self._clear_queue()
-                return order_id, status, "entry"
-            elif order_id == exit_order:
-                self._clear_queue()
-                return order_id, status, "exit"
-            else:
-                self.logger.debug(f"Order ID {order_id} does not match entry or exit order.")
 
-        except queue.Empty:
-            self.logger.debug("No messages in the queue.")
-        except Exception as e:
-            self.logger.error(f"Error retrieving or parsing message from queue: {e}")
+        while not self.stop_event.is_set() and self.is_active:
+            try:
+                # Woken by the order dispatcher as soon as either order fills
+                fill = self.order_dispatcher.await_any_fill((entry_order_id, exit_order_id), timeout=1)
+                if not fill:
+                    continue
+
+                order_id, order = fill
+                order_type = OrderRoleEnum.ENTRY.value if order_id == entry_order_id else OrderRoleEnum.EXIT.value
+                status = "ok"
+                if order_type == OrderRoleEnum.EXIT.value:
+                    self.exit_filled_at = time.perf_counter()
+
+                self.logger.info(
+                    f"Order confirmed: order_id={order_id}, status={status}, type={order_type}"
+                )
+                return order_type
 
-        return None  # Default return if no matching message is found
+            except Exception as e:
+                self.logger.error(f"Unexpected error while waiting for order fill: {e}")
 
-    def _clear_queue(self):
-        """
-        Helper function to clear all remaining messages in the queue.
-        """
-        try:
-            while not self.ws_client.q.empty():
-                self.ws_client.q.get_nowait()  # Non-blocking removal of messages
-            self.logger.debug("Queue cleared.")
-        except Exception as e:
-            self.logger.error(f"Error while clearing the queue: {e}")
+        return None
 
-    def _handle_entry_order(self, message, entry_order, exit_order, status):
-        """Handles entry order-specific logic."""
+    def _handle_entry_order(self):
+        """Handles a filled entry order and moves the ladder one level down."""
+        entry_order, exit_order, status = self.entry_order_id, self.exit_order_id, 'ok'
         self.logger.info(f'Entry Order placed from websocket {entry_order}')
         try:
             with self.lock:
-                order = Orders.objects.filter(level__strategy=self.strategy, entry_order_id=entry_order, is_complete=False).first()
+                order = self.order_book.get(entry_order)
                 if not order:
                     self.logger.error(f"Order not found for Entry order:{entry_order} Level {self.current_level}")
                     raise Orders.DoesNotExist
 
                 # Update order details
-                order.entry_order_status = 1 if status == 'ok' else 2
-                order.is_entry = True
-                order.save()
+                self.order_book.update(order, entry_order_status=1 if status == 'ok' else 2, is_entry=True)
                 self.logger.info(f"Entry Order Created: Entry Order:{entry_order} Level {self.current_level}")
 
             if self.strategy.is_hedging:
                 # Place hedging orders if the strategy requires it
-                hedging_order = self._place_and_process_order(
-                    order_type=OrderTypeEnum.MARKET_ORDER.value,
-                    side=TransactionTypeEnum.BUY.value,
-                    order_role=OrderRoleEnum.ENTRY.value,
-                    level=self.current_level,
-                    is_hedging_order=True,
-                )
+                hedging_order, = self._place_market_orders([
+                    (TransactionTypeEnum.BUY.value, OrderRoleEnum.ENTRY.value, self.current_level, True),
+                ])
                 self.logger.info(f"Hedging Entry Order Placed.for Order ID: {hedging_order}")
 
             self.cancel_orders(exit_order)
             self.current_level_index += 1
-            self.process_next_level()
+            return StrategyStateEnum.LADDER_ARMED
         except Exception as ex:
             self.logger.debug(f'Exception happened inside handle_entry_order: {ex}')
+            return StrategyStateEnum.STOPPED
 
-    def _handle_exit_order(self, message, entry_order, exit_order, status):
-        """Handles exit order-specific logic."""
+    def _handle_exit_order(self):
+        """Handles a filled exit order and moves the ladder one level up, or rolls over from the base level."""
+        entry_order, exit_order, status = self.entry_order_id, self.exit_order_id, 'ok'
         self.logger.info(f'Exit Order placed from websocket {exit_order} Status {status}')
         try:
             with self.lock:
-                order = Orders.objects.filter(level__strategy=self.strategy, entry_order_id__isnull=False, is_entry=True, is_complete=False, level=self.current_level).first()
+                order = self.order_book.get(exit_order)
                 if not order:
                     self.logger.debug(f"Exit Order Not found for Order ID: {exit_order}, Level: {self.current_level}")
                     raise Orders.DoesNotExist
 
                 self.logger.info(f"Updating Exit order: Order Level: {exit_order}, Level: {self.current_level_index}")
                 # Update order details
-                order.exit_order_status = 1 if status == 'ok' else 2
-                order.is_complete = True
-                order.exit_order_id = exit_order
-                order.save()
+                self.order_book.update(order, exit_order_status=1 if status == 'ok' else 2, is_complete=True, exit_order_id=exit_order)
                 self.logger.info(f"Exit Order updated successfully: {exit_order}")
 
             if self.strategy.is_hedging:
                 self.logger.debug("Exiting hedging order ")
 
                 # Place hedging orders if the strategy requires it
-                hedging_order = self._place_and_process_order(
-                    order_type=OrderTypeEnum.MARKET_ORDER.value,
-                    side=TransactionTypeEnum.SELL.value,
-                    order_role=OrderRoleEnum.EXIT.value,
-                    level=self.current_level,
-                    is_hedging_order=True,
-                )
+                hedging_order, = self._place_market_orders([
+                    (TransactionTypeEnum.SELL.value, OrderRoleEnum.EXIT.value, self.current_level, True),
+                ])
                 self.logger.info(f"Hedging market order placed successfully. Order ID: {hedging_order}")
 
             # Strategy logic
             if self.current_level_index == 0:
                 self.logger.info('Exit strategy logic triggered')
-                self._execute_exit_strategy()
-            else:
-                self.current_level_index -= 1
-                self.cancel_orders(entry_order)
-                self.logger.info('Processing next level...')
-                self.process_next_level()
+                return StrategyStateEnum.ROLLOVER
+
+            self.current_level_index -= 1
+            self.cancel_orders(entry_order)
+            self.logger.info('Processing next level...')
+            return StrategyStateEnum.LADDER_ARMED
 
         except Orders.DoesNotExist:
             self.logger.error(f"No matching order found for exit_order_id: {exit_order}")
         except Exception as e:
             self.logger.error(f"Error while handling exit order: {e}")
+        return StrategyStateEnum.STOPPED
 
     def _execute_exit_strategy(self):
-        """Executes the strategy exit logic and resets for a new instrument."""
+        """Executes the strategy exit logic and resets for a new instrument, then starts over."""
 
         self.logger.debug('Exit strategy mechanism triggered')
+        self.rollover_started_at = self.exit_filled_at or time.perf_counter()
         self.cancel_orders()
         self.close_all_open_orders()
+        self._flush_orders()
         self.strike_direction = 'call' if self.strike_direction == 'put' else 'put'
         instrument_symbol, instrument_price = get_instrument(
             self.index, self.strike_distance, self.strike_direction, expiry=self.expiry
@@ -350,12 +486,14 @@ class TradingStrategy1:
         hedging_instrument, hedging_instrument_price = get_instrument(self.index, self.hedging_strike_distance, self.hedging_strike_direction, expiry=self.expiry)
         self.hedging_instrument = hedging_instrument
 
+        table_started_at = time.perf_counter()
         create_table(instrument_price, self.main_target, self.strategy, self.hedging_limit_price, table=self.data_table)
+        self.logger.info(f"Rollover ladder regenerated in {(time.perf_counter() - table_started_at) * 1000:.1f} ms")
         self.instrument = instrument_symbol
         self.strategy.main_instrument = self.instrument
         self.strategy.hedging_instrument = self.hedging_instrument
         self.strategy.save()
-        self.run_strategy()
+        return StrategyStateEnum.INITIAL_ENTRY
 
     def place_initial_market_order(self, level):
         """Places a market order for the first level and optional hedging orders."""
@@ -365,41 +503,78 @@ class TradingStrategy1:
                 self.logger.error("Level information is missing.")
                 raise ValueError("Level information is required.")
 
-            # Place the initial market order
-            initial_order = self._place_and_process_order(
-                order_type=OrderTypeEnum.MARKET_ORDER.value,
-                side=TransactionTypeEnum.BUY.value,
-                order_role=OrderRoleEnum.ENTRY.value,
-                level=level,
-                is_hedging_order=False,
-            )
-            self.logger.info(f"Initial market order placed successfully. Order ID: {initial_order}")
+            # Place the initial market order, together with the hedging order if the strategy requires it
+            legs = [(TransactionTypeEnum.BUY.value, OrderRoleEnum.ENTRY.value, level, False)]
+            if self.strategy.is_hedging:
+                legs.append((TransactionTypeEnum.BUY.value, OrderRoleEnum.ENTRY.value, level, True))
 
-            # Place hedging orders if the strategy requires it
+            order_ids = self._place_market_orders(legs)
+            self.logger.info(f"Initial market order placed successfully. Order ID: {order_ids[0]}")
             if self.strategy.is_hedging:
-                hedging_order = self._place_and_process_order(
-                    order_type=OrderTypeEnum.MARKET_ORDER.value,
-                    side=TransactionTypeEnum.BUY.value,
-                    order_role=OrderRoleEnum.ENTRY.value,
-                    level=level,
-                    is_hedging_order=True,
-                )
-                self.logger.info(f"Hedging market order placed successfully. Order ID: {hedging_order}")
+                self.logger.info(f"Hedging market order placed successfully. Order ID: {order_ids[1]}")
 
         except Exception as e:
             self.logger.critical(f"Error while placing initial market order: {e}", exc_info=True)
             raise
 
-    def _place_and_process_order(self, order_type, side, order_role, level, is_hedging_order):
-        """Places an order and processes the response."""
-        response, price, quantity = self.place_order(
-            order_type=order_type,
-            side=side,
-            order_role=order_role,
-            level=level,
-            is_hedging_order=is_hedging_order,
-        )
+    def _place_market_orders(self, legs):
+        """
+        Places market orders together, as one multi-order request where the broker supports it, and records them.
+
+        Hedge fill prices are taken from the order stream (`_fill_price`) instead of one
+        orderbook call per order.
+
+        Args:
+            legs (list): (side, order role, level, is_hedging_order) per order.
+
+        Returns:
+            list: Order id per leg, in the order given.
+
+        Raises:
+            OrderPlacementError: If any leg was rejected. Accepted legs are still recorded: market
+                orders fill at once and cannot be rolled back.
+        """
+        order_type = OrderTypeEnum.MARKET_ORDER.value
+        prepared = [
+            self._prepare_and_calculate_order(side, level, order_type, is_hedging_order=is_hedging_order)
+            for side, _, level, is_hedging_order in legs
+        ]
+        responses = place_orders(self.fyers, [order_data for _, _, order_data in prepared])
+
+        order_ids, errors = [], []
+        for (_, order_role, level, is_hedging_order), (price, quantity, _), response in zip(legs, prepared, responses):
+            try:
+                order_id = self._accepted_order_id(response)
+            except RuntimeError as e:
+                errors.append(f"{'hedge' if is_hedging_order else 'main'} leg: {e}")
+                order_ids.append(None)
+                continue
+
+            if is_hedging_order:
+                price = self._fill_price(order_id, quantity)
+            self._handle_order_response(order_id, order_role, level, price, quantity, order_type, is_hedge=is_hedging_order)
+            order_ids.append(order_id)
+
+        if errors:
+            raise OrderPlacementError("; ".join(errors))
+        return order_ids
+
+    def _fill_price(self, order_id, quantity=None):
+        """
+        Returns the traded price of an order from its fill on the order stream.
 
+        The orderbook is only asked if the order is not fully filled within `ORDER_FILL_PRICE_TIMEOUT`.
+        """
+        price = self.fill_prices.get(order_id, timeout=settings.ORDER_FILL_PRICE_TIMEOUT, quantity=quantity)
+        # Nobody waits on the fill of a market order through the dispatcher
+        self.order_dispatcher.discard(order_id)
+        if price is None:
+            self.logger.warning(f"No complete fill for order {order_id} on the order stream, asking the orderbook.")
+            return self.get_price_using_order_id(order_id)
+        return price
+
+    def _accepted_order_id(self, response):
+        """Returns the order id of a successful placement response, raising RuntimeError for a rejected one."""
         # Validate API response
         if response.get('s') != 'ok':
             self.logger.error(f"Order placement failed. Response: {response}")
@@ -410,9 +585,6 @@ class TradingStrategy1:
         if not order_id:
             self.logger.error("Failed to process the order: Order ID is None.")
             raise RuntimeError("Order processing failed: Order ID is None.")
-
-        # Handle order response
-        self._handle_order_response(order_id, order_role, level, price, quantity, order_type, is_hedge=is_hedging_order)
         return order_id
 
     def stop_strategy(self):
@@ -423,8 +595,14 @@ class TradingStrategy1:
 
     def cleanup(self):
         self.logger.info("Cleaning up resources...")
-        self.cancel_orders()
-        self.close_all_open_orders()
+        try:
+            self.cancel_orders()
+            self.close_all_open_orders()
+            self._flush_orders()
+        except Exception as e:
+            self.logger.exception(f"Error during cleanup: {e}")
+        finally:
+            self.order_stream.unsubscribe(self.order_stream_key)
         self.logger.info("Cleanup complete.")
 
     def place_order(self, order_type, side, order_role, level, is_hedging_order=False):
@@ -473,11 +651,13 @@ class TradingStrategy1:
             if is_hedge:
                 self.logger.debug(f"Created hedging order {price} Quantity:{quantity} ID:{order_id} Type {order_type}")
 
-                # Check the price for market order after placement
-                price = self.get_price_using_order_id(order_id)
+                # Market order fill prices normally come from the order stream
+                if price in [None, '']:
+                    price = self._fill_price(order_id, quantity)
 
-            Orders.objects.create(
-                level=level,
+            self.order_book.add(Orders(
+                level_id=level.id,
+                strategy_id=level.strategy_id,
                 entry_price=price if price else None,
                 order_quantity=quantity,
                 entry_order_id=order_id,
@@ -485,7 +665,7 @@ class TradingStrategy1:
                 is_entry=True,
                 is_main=False if is_hedge else True,
                 is_complete=False
-            )
+            ))
             self.logger.debug("Entry order record successfully created.")
         except Exception as e:
             self.logger.error(f"Failed to create entry order record for level {level}: {e}")
@@ -503,21 +683,23 @@ class TradingStrategy1:
         """
         try:
             is_main = not is_hedge
-            price = self.get_price_using_order_id(order_id) if price in [None, ''] else price
+            price = self._fill_price(order_id) if price in [None, ''] else price
             self.logger.debug(f"Updating exit order | Is Main: {is_main}  price: {price}")
 
-            order = Orders.objects.filter(level__strategy=self.strategy, level=level, entry_order_id__isnull=False, is_complete=False, exit_order_id__isnull=True, is_main=is_main).first()
+            order = self.order_book.open_position(level.id, is_main=is_main)
             if not order:
                 self.logger.error(f"No entry order found for level {self.current_level} to update exit order.")
                 return  # Move to the next step instead of stopping the thread
 
             # Update the exit order details
-            order.exit_order_status = 2 if not is_hedge else 1
-            order.exit_order_id = order_id
-            order.exit_price = price
-            order.exit_time = datetime.now()
-            order.is_complete = True if is_hedge else False
-            order.save()
+            self.order_book.update(
+                order,
+                exit_order_status=2 if not is_hedge else 1,
+                exit_order_id=order_id,
+                exit_price=price,
+                exit_time=datetime.now(),
+                is_complete=True if is_hedge else False,
+            )
 
             self.logger.debug(f"Exit order updated successfully for Level {self.current_level} | Order ID: {order_id}")
         except Exception as e:
@@ -529,62 +711,52 @@ class TradingStrategy1:
         """Rounds a price to the nearest tick size."""
         return round(float(price) / tick_size) * tick_size
 
-    @retry_on_exception(exceptions=(requests.RequestException,))
     def get_price_using_order_id(self, order_id):
         """
         Fetches the price using order ID, handling errors gracefully and logging issues.
 
+        Only used when the fill did not complete on the order stream. The orderbook is asked
+        a bounded number of times (`_fetch_traded_price`) so the strategy thread is never
+        stalled for long.
+
         Args:
             order_id (str): The ID of the order to fetch the price for.
 
         Returns:
             float or None: The traded price if fetched successfully, otherwise None.
         """
-        price = None  # Default to None in case of failure
-
         try:
-            response = self.fyers.orderbook(data={"id": order_id})
-
-            # Validate response and fetch traded price
-            if response and isinstance(response, list):
-                price = float(response[0].get("tradedPrice"))
-
-            if price is None:
-                self.logger.warning(f"Failed to fetch price for order ID {order_id}: {response}")
-
+            return self._fetch_traded_price(order_id)
         except Exception as e:
             self.logger.error(f"Error fetching price for order ID {order_id}: {e}")
+            return None
 
-        return price
+    @retry_on_exception(max_retries=3, delay=0.5, exceptions=(requests.RequestException, RuntimeError))
+    def _fetch_traded_price(self, order_id):
+        """Returns the traded price of a fully traded order from the orderbook, raising RuntimeError until it is."""
+        response = self.fyers.orderbook(data={"id": order_id})
+
+        # The orderbook comes as {"s": "ok", "orderBook": [...]}; a bare list is accepted as well
+        orders = response.get("orderBook") if isinstance(response, dict) else response
+        order = next((order for order in orders or [] if order.get("id") in (None, order_id)), None)
+        if not order or order.get("status") != BrokerOrderStatusEnum.TRADED.value or order.get("tradedPrice") in (None, ""):
+            raise RuntimeError(f"Order {order_id} is not traded yet: {response}")
+        return float(order["tradedPrice"])
 
     def fetch_levels(self, current_level=None):
-        """Fetch levels from the OrderLevels model."""
+        """Fetch the current, previous and next levels from the cached ladder of the strategy."""
         with self.lock:
 
             # Initialize index based on provided current_level
             self.current_level_index = current_level if current_level is not None else 0
 
-            # Fetch all levels for the strategy at once
-            levels_queryset = OrderLevel.objects.filter(strategy=self.strategy, strategy__main_instrument=self.instrument).order_by('level_number')
-
-            # Convert queryset to a list for easier indexing
-            levels = list(levels_queryset)
+            # Loaded from the OrderLevels model only when the ladder is missing or invalidated
+            ladder = self.ladder = ladder_cache.get(self.strategy, self.instrument)
 
-            # Get current level
-            self.current_level = next((level for level in levels if level.level_number == self.current_level_index), None)
-
-            # Get previous level (if exists)
-            if self.current_level_index > 0:
-                self.previous_level = next((level for level in levels if level.level_number == self.current_level_index - 1), None)
-            else:
-                self.previous_level = None  # No previous level exists
-
-            self.levels_length = max(levels, key=lambda x: x.level_number).level_number
-            # Get next level (if exists)
-            if self.current_level_index < self.levels_length:
-                self.next_level = next((level for level in levels if level.level_number == self.current_level_index + 1), None)
-            else:
-                self.next_level = None  # No next level exists
+            self.current_level = ladder.get(self.current_level_index)
+            self.previous_level = ladder.get(self.current_level_index - 1) if self.current_level_index > 0 else None
+            self.levels_length = ladder.levels_length
+            self.next_level = ladder.get(self.current_level_index + 1) if self.current_level_index < self.levels_length else None
             self.logger.info({'Current Level': self.current_level, "Next Level": self.next_level, "Previous Level": self.previous_level})
 
     def cancel_orders(self, order_id=None):
@@ -607,20 +779,10 @@ class TradingStrategy1:
                 response = self.fyers.cancel_order(data=data)
 
                 if response.get('s') == "ok":
-                    order = Orders.objects.filter(Q(level__strategy=self.strategy), Q(entry_order_id=order_id) | Q(exit_order_id=order_id), is_complete=False).first()
-                    self.logger.info(f"Cancelling order for Order id {order_id} | {order.id}")
+                    order = self.order_book.get(order_id)
                     if order:
-                        if order.entry_order_id == order_id:
-                            order.entry_order_status = 3
-                            order.entry_order_id = None
-                            order.entry_price = None
-                        elif order.exit_order_id == order_id:
-                            order.exit_order_status = 3
-                            order.exit_order_id = None
-                            order.exit_price = None
-
-                        order.is_complete = True
-                        order.save()
+                        self.logger.info(f"Cancelling order for Order id {order_id} | {order.id}")
+                        self.order_book.update(order, is_complete=True, **self._cancelled_fields(order, order_id))
                         self.logger.info(f"Order {order_id} successfully updated to 'cancelled'.")
                     else:
                         self.logger.warning(f"Order {order_id} not found in the database.")
@@ -629,49 +791,58 @@ class TradingStrategy1:
 
                 cancelled_orders.append(response)
             else:
-                orders = Orders.objects.filter(
-                    level__strategy=self.strategy,
-                    entry_order_status=2,
-                    is_complete=False,
-                    exit_order_id__isnull=True
-                )
-                self.logger.debug(f"Found {orders.count()} pending orders to cancel.")
-
-                for order in orders:
-                    try:
-                        data = {"id": order.entry_order_id}  # Assuming entry_order_id is the correct field
-                        self.logger.info(f"Attempting to cancel order: {data['id']}")
-                        response = self.fyers.cancel_order(data=data)
-                        order_id = response.get('id')
-
-                        if response.get('s') == "ok":
-                            if order.entry_order_id == order_id:
-                                self.logger.debug(f"Updating entry order id {order.entry_order_id}")
-                                order.entry_order_status = 3
-                                order.entry_order_id = None
-                                order.entry_price = None
-                            elif order.exit_order_id == order_id:
-                                self.logger.debug(f"Updating exit order id {order.exit_order_id}")
-                                order.exit_order_status = 3
-                                order.exit_order_id = None
-                                order.exit_price = None
-
-                            order.is_complete = True
-                            order.save()
-                            self.logger.debug(f"Order {data['id']} successfully updated to 'cancelled'.")
-                        else:
-                            self.logger.error(f"Failed to cancel order {data['id']}. Response: {response}")
-
-                        cancelled_orders.append(response)
-                    except Exception as e:
-                        self.logger.error(f"Error while cancelling order {order.entry_order_id}: {e}")
-                        continue  # Log the error and move to the next order
+                orders = self.order_book.pending_entries()
+                self.logger.debug(f"Found {len(orders)} pending orders to cancel.")
+                cancelled_orders = self._cancel_pending_orders(orders)
 
         except Exception as e:
             self.logger.error(f"Unexpected error in cancel_orders: {e}")
 
         return cancelled_orders
 
+    def _cancel_pending_orders(self, orders):
+        """
+        Cancels pending orders all at once and marks the cancelled ones in the order book.
+
+        The orders are cancelled with multi-order requests, or concurrent single requests
+        where those are not available (see `cancel_broker_orders`). The rows are written by
+        the next `_flush_orders` in one journal batch, applied as one bulk update.
+
+        Returns:
+            list: The cancel response of each order.
+        """
+        if not orders:
+            return []
+
+        order_ids = [order.entry_order_id for order in orders]
+        self.logger.info(f"Attempting to cancel orders: {order_ids}")
+        started = time.perf_counter()
+        results = cancel_broker_orders(self.fyers, order_ids)
+        elapsed = time.perf_counter() - started
+
+        latencies, failed = [], 0
+        for order, order_id, (response, latency) in zip(orders, order_ids, results):
+            if isinstance(response, dict) and response.get('s') == "ok":
+                self.order_book.update(order, is_complete=True, **self._cancelled_fields(order, order_id))
+                self.logger.debug(f"Order {order_id} successfully updated to 'cancelled'.")
+                latencies.append(latency)
+            else:
+                # Still open at the broker, so it stays open in the book
+                self.logger.error(f"Failed to cancel order {order_id}. Response: {response}")
+                failed += 1
+
+        self._record_cancel_latencies(latencies, elapsed, failed)
+        return [response for response, _ in results]
+
+    @staticmethod
+    def _cancelled_fields(order, order_id):
+        """Returns the field changes that mark the entry or exit order `order_id` of an order row as cancelled."""
+        if order.entry_order_id == order_id:
+            return {"entry_order_status": 3, "entry_order_id": None, "entry_price": None}
+        if order.exit_order_id == order_id:
+            return {"exit_order_status": 3, "exit_order_id": None, "exit_price": None}
+        return {}
+
     def close_all_open_orders(self):
         data = {}
         response = self.fyers.exit_positions(data=data)
@@ -0,0 +1,132 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from tabulate import tabulate
+
+from accounts.constants import BrokerOrderStatusEnum, OrderRoleEnum, OrderTypeEnum, TransactionTypeEnum
+from accounts.main_strategy import TradingStrategy1
+from accounts.order_dispatcher import OrderDispatcher
+
+
+class FakeBroker:
+    """
+    Stands in for `FyersModel` with a fixed round-trip latency and no network access.
+
+    Filled orders are reported to the dispatcher the way the order websocket reports them.
+    """
+
+    def __init__(self, latency, dispatcher):
+        self.latency = latency
+        self.dispatcher = dispatcher
+        self.lock = threading.Lock()
+        self.order_count = 0
+
+    def place_order(self, data):
+        time.sleep(self.latency)
+        with self.lock:
+            self.order_count += 1
+            return {"s": "ok", "id": f"bench-{self.order_count}"}
+
+    def cancel_order(self, data):
+        time.sleep(self.latency)
+        return {"s": "ok", "id": data["id"]}
+
+    def fill(self, order_id):
+        self.dispatcher.dispatch({"s": "ok", "orders": {"id": order_id, "status": BrokerOrderStatusEnum.TRADED.value}})
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures fill-handling throughput of N concurrent TradingStrategy1 instances with per-strategy and shared locks. "
+        "Broker calls run outside the strategy lock and journaling happens after fill handling, so the lock only "
+        "guards in-memory order book and level updates; both columns are expected to be close."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strategies", default="1,2,4,8,16,32", help="Comma separated strategy counts to run.")
+        parser.add_argument("--fills", type=int, default=50, help="Fills handled by each strategy.")
+        parser.add_argument("--broker-latency", type=float, default=0.005, help="Seconds per fake broker round-trip.")
+
+    def handle(self, *args, **options):
+        rows = []
+        for count in [int(value) for value in options["strategies"].split(",")]:
+            shared = self._run(count, options, shared_lock=True)
+            per_strategy = self._run(count, options, shared_lock=False)
+            rows.append({
+                "Strategies": count,
+                "Shared lock (fills/s)": round(shared, 1),
+                "Per-strategy lock (fills/s)": round(per_strategy, 1),
+                "Speed-up": round(per_strategy / shared, 2),
+            })
+        self.stdout.write(tabulate(rows, headers="keys", tablefmt="grid"))
+
+    @classmethod
+    def _run(cls, count, options, shared_lock):
+        """
+        Runs `count` strategies concurrently and returns the total fills per second.
+
+        The strategies share one dispatcher, as they share the order stream in production.
+        With `shared_lock` every strategy uses the same lock, like the former class-level one.
+        That lock used to be held across database writes; since the order book it only covers
+        in-memory updates, which is all the shared-lock column still contends on.
+        """
+        dispatcher = OrderDispatcher()
+        broker = FakeBroker(options["broker_latency"], dispatcher)
+        strategies = [cls._strategy(number, broker, dispatcher) for number in range(count)]
+
+        global_lock = threading.Lock()
+        if shared_lock:
+            for strategy in strategies:
+                strategy.lock = global_lock
+        threads = [threading.Thread(target=cls._handle_fills, args=(strategy, broker, options["fills"])) for strategy in strategies]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return count * options["fills"] / elapsed
+
+    @staticmethod
+    def _strategy(number, broker, dispatcher):
+        """Builds a strategy on a stand-in `OrderStrategy` row and the fake broker; nothing is read from the database."""
+        strategy = SimpleNamespace(
+            id=f"bench-{number}", main_instrument="NSE:BENCH", hedging_instrument=None, is_active=True, is_hedging=False,
+        )
+        return TradingStrategy1({
+            "strategy": strategy, "target": 1, "hedging_limit_price": 0, "access_token": "bench", "index": "BENCH", "expiry": None,
+        }, fyers=broker, order_dispatcher=dispatcher)
+
+    @staticmethod
+    def _handle_fills(strategy, broker, fills):
+        """
+        Arms the entries of two levels, fills one and handles it, `fills` times.
+
+        Goes through `place_order`, `_handle_order_response`, `wait_for_order_confirmation`
+        and `_handle_entry_order`, which cancels the other entry. Journaling the changed rows
+        happens after the next orders are armed and is not part of fill handling.
+        """
+        for fill in range(fills):
+            levels = [
+                SimpleNamespace(id=fill * 2 + offset, strategy_id=strategy.strategy.id, level_number=fill * 2 + offset,
+                                main_percentage=100 - fill, main_target=101 - fill, main_quantity=1)
+                for offset in (0, 1)
+            ]
+            order_ids = []
+            for level in levels:
+                response, price, quantity = strategy.place_order(
+                    OrderTypeEnum.LIMIT_ORDER.value, TransactionTypeEnum.BUY.value, OrderRoleEnum.ENTRY.value, level,
+                )
+                strategy._handle_order_response(
+                    response["id"], OrderRoleEnum.ENTRY.value, level, price, quantity, OrderTypeEnum.LIMIT_ORDER.value,
+                )
+                order_ids.append(response["id"])
+
+            strategy.exit_order_id, strategy.entry_order_id = order_ids
+            broker.fill(strategy.entry_order_id)
+            strategy.wait_for_order_confirmation(strategy.entry_order_id, strategy.exit_order_id)
+            strategy._handle_entry_order()
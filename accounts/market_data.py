@@ -0,0 +1,291 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .constants import CE, PE
+from .logging_setup import get_strategy_logger
+
+OptionQuote = namedtuple("OptionQuote", ["symbol", "strike", "ltp", "bid", "ask"])
+
+# Most symbols the broker accepts in one `quotes` call
+QUOTES_BATCH_SIZE = 50
+
+
+def fetch_quotes(fyers, symbols):
+    """
+    Fetches quotes for all symbols in as few `quotes` calls as possible.
+
+    Args:
+        fyers: FyersModel client.
+        symbols (iterable): Symbols to quote; duplicates and empty values are ignored.
+
+    Returns:
+        dict: Symbol to quote values (`v` of the broker response). Symbols the broker
+        returned no data for are left out.
+    """
+    symbols = list(dict.fromkeys(symbol for symbol in symbols if symbol))
+    quotes = {}
+    for start in range(0, len(symbols), QUOTES_BATCH_SIZE):
+        batch = symbols[start:start + QUOTES_BATCH_SIZE]
+        response = fyers.quotes(data={"symbols": ",".join(batch)})
+        for item in response.get('d') or []:
+            if item.get('s') == 'ok' and isinstance(item.get('v'), dict):
+                quotes[item['n']] = item['v']
+    return quotes
+
+
+class _OptionLeg:
+    """Calls or puts of a chain as parallel arrays, in the order the broker returned them."""
+    __slots__ = ("symbols", "strikes", "ltp", "bid", "ask", "middle", "direction", "_positions_by_strike")
+
+    def __init__(self, items, direction):
+        self.symbols = np.array([item.get('symbol') for item in items], dtype=object)
+        self.strikes = np.array([item.get('strike_price', np.nan) for item in items], dtype=np.float64)
+        self.ltp = np.array([item.get('ltp', np.nan) for item in items], dtype=np.float64)
+        self.bid = np.array([item.get('bid', np.nan) for item in items], dtype=np.float64)
+        self.ask = np.array([item.get('ask', np.nan) for item in items], dtype=np.float64)
+        self.middle = len(items) // 2
+        # Calls count offsets down from the middle, puts count them up
+        self.direction = -1 if direction == CE else 1
+        self._positions_by_strike = {strike: position for position, strike in enumerate(self.strikes.tolist())}
+
+    def position(self, offset):
+        position = self.middle + self.direction * offset
+        return position if 0 <= position < len(self.symbols) else None
+
+    def position_by_strike(self, strike):
+        return self._positions_by_strike.get(float(strike))
+
+    def offset(self, position):
+        return (position - self.middle) * self.direction
+
+    def quote(self, position):
+        if position is None:
+            return None
+        return OptionQuote(
+            self.symbols[position], float(self.strikes[position]), float(self.ltp[position]),
+            float(self.bid[position]), float(self.ask[position]),
+        )
+
+
+class OptionChain:
+    """
+    Option chain snapshot built once per broker response.
+
+    Strikes, symbols, LTPs, bids and asks of each leg are kept in parallel NumPy arrays so a
+    leg can be looked up in O(1) by signed strike offset (0 = ATM, same convention as the
+    strike distance chosen by the user) or by strike price, and queried as a whole, e.g.
+    for the strike whose premium is closest to a target.
+    """
+    __slots__ = ("legs",)
+
+    def __init__(self, options_chain):
+        # The first entry is the underlying itself
+        calls, puts = [], []
+        for item in options_chain[1:]:
+            option_type = item.get('option_type')
+            if option_type == CE:
+                calls.append(item)
+            elif option_type == PE:
+                puts.append(item)
+            else:
+                raise ValueError(f"Invalid option type: {option_type}")
+
+        if len(calls) != len(puts):
+            raise ValueError("Mismatched call/put data count.")
+
+        self.legs = {CE: _OptionLeg(calls, CE), PE: _OptionLeg(puts, PE)}
+
+    def get(self, option_type, offset):
+        """Returns the quote of the CE/PE option at the signed strike offset, or None if out of range."""
+        leg = self.legs[option_type]
+        return leg.quote(leg.position(offset))
+
+    def by_strike(self, option_type, strike):
+        """Returns the quote of the CE/PE option at the given strike price, or None if not in the chain."""
+        leg = self.legs[option_type]
+        return leg.quote(leg.position_by_strike(strike))
+
+    def nearest_to_premium(self, option_type, premium):
+        """Returns (offset, quote) of the CE/PE option whose LTP is closest to the premium."""
+        leg = self.legs[option_type]
+        distances = np.abs(leg.ltp - premium)
+        if np.all(np.isnan(distances)):
+            return None
+        position = int(np.nanargmin(distances))
+        return leg.offset(position), leg.quote(position)
+
+
+class _Snapshot:
+    """A cached option chain response and the `OptionChain` built from it on first use."""
+    __slots__ = ("expires_at", "response", "_chain")
+
+    def __init__(self, expires_at, response):
+        self.expires_at = expires_at
+        self.response = response
+        self._chain = None
+
+    @property
+    def is_complete(self):
+        return bool(self.response and self.response.get('data') and self.response['data'].get('optionsChain'))
+
+    @property
+    def chain(self):
+        if self._chain is None and self.is_complete:
+            self._chain = OptionChain(self.response['data']['optionsChain'])
+        return self._chain
+
+
+class _Fetch:
+    """A broker call in progress that concurrent callers for the same key wait on."""
+    __slots__ = ("event", "snapshot", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.snapshot = None
+        self.error = None
+
+
+class OptionChainCache:
+    """
+    Short-lived, process-wide cache of option chain snapshots.
+
+    Snapshots are keyed by (index, expiry timestamp, strikecount) and kept for
+    `OPTION_CHAIN_CACHE_TTL` seconds. A request is also served by a fresh snapshot of the
+    same index and expiry with a larger strikecount, since strike offsets are relative to
+    the ATM strike in the middle of the chain. Concurrent requests for a key that is
+    already being fetched wait for that call instead of issuing their own.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else settings.OPTION_CHAIN_CACHE_TTL
+        self.lock = threading.Lock()
+        self._snapshots = {}
+        self._fetches = {}
+
+    def get(self, fyers, index, timestamp, strikecount):
+        """
+        Returns the option chain response for the given index, expiry and strikecount.
+
+        Args:
+            fyers: FyersModel client used when the snapshot has to be fetched.
+            index (str): The index symbol.
+            timestamp: Expiry timestamp, or "" for the nearest expiry.
+            strikecount (int): Number of strikes on each side of the ATM strike.
+
+        Returns:
+            dict: The raw `optionchain` response.
+        """
+        return self._get_snapshot(fyers, index, timestamp, strikecount).response
+
+    def get_chain(self, fyers, index, timestamp, strikecount):
+        """
+        Same as `get`, but returns the indexed `OptionChain` of the snapshot.
+
+        Returns:
+            OptionChain or None: None if the response has no options chain data.
+        """
+        return self._get_snapshot(fyers, index, timestamp, strikecount).chain
+
+    def invalidate(self, index=None):
+        """Drops cached snapshots of one index, or of all indexes."""
+        with self.lock:
+            for key in [key for key in self._snapshots if index is None or key[0] == index]:
+                del self._snapshots[key]
+
+    def _get_snapshot(self, fyers, index, timestamp, strikecount):
+        key = (index, timestamp, strikecount)
+
+        with self.lock:
+            snapshot = self._lookup(index, timestamp, strikecount)
+            if snapshot is not None:
+                return snapshot
+
+            fetch = self._fetches.get(key)
+            is_owner = fetch is None
+            if is_owner:
+                fetch = self._fetches[key] = _Fetch()
+
+        if not is_owner:
+            fetch.event.wait()
+            if fetch.error:
+                raise fetch.error
+            return fetch.snapshot
+
+        try:
+            response = fyers.optionchain(data={"symbol": index, "strikecount": strikecount, "timestamp": timestamp})
+            fetch.snapshot = _Snapshot(time.monotonic() + self.ttl, response)
+        except Exception as e:
+            fetch.error = e
+            raise
+        finally:
+            with self.lock:
+                # Only cache complete snapshots; errors and partial responses are retried next time
+                if fetch.snapshot is not None and fetch.snapshot.is_complete:
+                    self._snapshots[key] = fetch.snapshot
+                del self._fetches[key]
+            fetch.event.set()
+
+        return fetch.snapshot
+
+    def _lookup(self, index, timestamp, strikecount):
+        """Returns a fresh snapshot covering the request, dropping expired ones. Caller must hold the lock."""
+        now = time.monotonic()
+        best_key = None
+        for key, snapshot in list(self._snapshots.items()):
+            if snapshot.expires_at <= now:
+                del self._snapshots[key]
+            elif key[0] == index and key[1] == timestamp and key[2] >= strikecount:
+                if best_key is None or key[2] < best_key[2]:
+                    best_key = key
+        return self._snapshots[best_key] if best_key else None
+
+
+class ExpiryCalendar:
+    """
+    Expiry date to expiry timestamp map of each index, kept for the trading day.
+
+    Expiry lists change at most once a day, so the map is stored in the Django cache until
+    the next `EXPIRY_CALENDAR_REFRESH_TIME` (local time) and an expiry-qualified option
+    chain lookup only needs the broker call for the chain itself.
+    """
+
+    def __init__(self, refresh_time=None):
+        refresh_time = refresh_time or settings.EXPIRY_CALENDAR_REFRESH_TIME
+        self.refresh_time = datetime.strptime(refresh_time, "%H:%M").time()
+
+    @staticmethod
+    def _cache_key(index):
+        return f"expiry_calendar_{index}"
+
+    def get(self, index):
+        """Returns the cached expiry map of the index, or None if it has to be fetched (also when the cache is down)."""
+        try:
+            return cache.get(self._cache_key(index))
+        except Exception as e:
+            get_strategy_logger("ExpiryCalendar").warning(f"Expiry calendar cache unavailable, fetching {index} directly: {e}")
+            return None
+
+    def set(self, index, expiry_data):
+        """Stores the expiry map of the index until the next refresh time; a failing cache is only logged."""
+        try:
+            cache.set(self._cache_key(index), expiry_data, timeout=self._seconds_until_refresh())
+        except Exception as e:
+            get_strategy_logger("ExpiryCalendar").warning(f"Failed to cache the expiry calendar of {index}: {e}")
+
+    def _seconds_until_refresh(self):
+        now = timezone.localtime()
+        refresh_at = now.replace(hour=self.refresh_time.hour, minute=self.refresh_time.minute, second=0, microsecond=0)
+        if refresh_at <= now:
+            refresh_at += timedelta(days=1)
+        return max(int((refresh_at - now).total_seconds()), 1)
+
+
+option_chain_cache = OptionChainCache()
+expiry_calendar = ExpiryCalendar()
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_alter_orders_level'),
+    ]
+
+    operations = [
+        # Nullable so the text column can be restored and refilled when migrating backwards
+        migrations.AlterField(
+            model_name='pricequantitytable',
+            name='price_quantity_data',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='pricequantitytable',
+            name='schema_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='pricequantitytable',
+            name='table_type',
+            field=models.CharField(choices=[('ladder', 'Ladder'), ('buy_sell', 'Buy/Sell')], default='ladder', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='pricequantitytable',
+            name='price_quantity_json',
+            field=models.JSONField(null=True),
+        ),
+        migrations.CreateModel(
+            name='PriceQuantityLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level_number', models.IntegerField()),
+                ('main_percentage', models.FloatField()),
+                ('main_quantity', models.FloatField()),
+                ('main_target', models.FloatField()),
+                ('hedge_percentage', models.FloatField(blank=True, null=True)),
+                ('hedge_market_quantity', models.FloatField(blank=True, null=True)),
+                ('hedge_limit_quantity', models.FloatField(blank=True, null=True)),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='accounts.pricequantitytable')),
+            ],
+            options={
+                'ordering': ['table', 'level_number'],
+                'constraints': [models.UniqueConstraint(fields=('table', 'level_number'), name='unique_table_level_number')],
+            },
+        ),
+    ]
@@ -0,0 +1,118 @@
+import json
+
+import fastjsonschema
+from django.db import migrations
+
+# Frozen copies of accounts.table_schema as of this migration; later schema changes must not alter it
+SCHEMA_VERSION = 1
+
+_LEVEL_KEY = "^-?[0-9]+$"
+_NUMBER = {"type": "number"}
+_QUANTITY = {"type": "number", "minimum": 0}
+
+TABLE_SCHEMAS = {
+    'ladder': {
+        "type": "object",
+        "minProperties": 1,
+        "propertyNames": {"pattern": _LEVEL_KEY},
+        "additionalProperties": {
+            "type": "object",
+            "required": ["main_percentage", "main_quantity", "main_target"],
+            "properties": {
+                "main_percentage": _NUMBER,
+                "main_quantity": _QUANTITY,
+                "main_target": _NUMBER,
+                "hedge_percentage": _NUMBER,
+                "hedge_market_quantity": _QUANTITY,
+                "hedge_limit_quantity": _QUANTITY,
+            },
+        },
+    },
+    'buy_sell': {
+        "type": "object",
+        "minProperties": 1,
+        "propertyNames": {"pattern": _LEVEL_KEY},
+        "additionalProperties": {
+            "type": "object",
+            "required": ["call_quantity", "put_quantity"],
+            "properties": {
+                "call_quantity": _QUANTITY,
+                "put_quantity": _QUANTITY,
+                "call_price": _NUMBER,
+                "put_price": _NUMBER,
+            },
+        },
+    },
+}
+
+
+def detect_table_type(data):
+    """Returns the type of table the data matches, or None if it matches none."""
+    for table_type, schema in TABLE_SCHEMAS.items():
+        try:
+            fastjsonschema.validate(schema, data)
+            return table_type
+        except fastjsonschema.JsonSchemaException:
+            continue
+    return None
+
+
+def level_rows(data):
+    """Returns the `PriceQuantityLevel` field values of every level of ladder table data."""
+    return [{
+        "level_number": int(key),
+        "main_percentage": level["main_percentage"],
+        "main_quantity": level["main_quantity"],
+        "main_target": level["main_target"],
+        "hedge_percentage": level.get("hedge_percentage"),
+        "hedge_market_quantity": level.get("hedge_market_quantity"),
+        "hedge_limit_quantity": level.get("hedge_limit_quantity"),
+    } for key, level in data.items()]
+
+
+def forwards(apps, schema_editor):
+    """
+    Copies every table's JSON text into the JSON column and normalises ladder levels.
+
+    Tables whose data matches no current schema keep their data (as a JSON string if it is
+    not valid JSON), with schema_version 0.
+    """
+    PriceQuantityTable = apps.get_model('accounts', 'PriceQuantityTable')
+    PriceQuantityLevel = apps.get_model('accounts', 'PriceQuantityLevel')
+
+    for table in PriceQuantityTable.objects.all():
+        try:
+            data = json.loads(table.price_quantity_data)
+        except (TypeError, ValueError):
+            data = table.price_quantity_data
+
+        table_type = detect_table_type(data)
+        table.price_quantity_json = data
+        table.table_type = table_type or 'ladder'
+        table.schema_version = SCHEMA_VERSION if table_type else 0
+        table.save(update_fields=['price_quantity_json', 'table_type', 'schema_version'])
+
+        if table_type == 'ladder':
+            PriceQuantityLevel.objects.bulk_create([PriceQuantityLevel(table=table, **row) for row in level_rows(data)])
+
+
+def backwards(apps, schema_editor):
+    PriceQuantityTable = apps.get_model('accounts', 'PriceQuantityTable')
+    PriceQuantityLevel = apps.get_model('accounts', 'PriceQuantityLevel')
+
+    PriceQuantityLevel.objects.all().delete()
+    for table in PriceQuantityTable.objects.all():
+        data = table.price_quantity_json
+        table.price_quantity_data = data if table.schema_version == 0 and isinstance(data, str) else json.dumps(data)
+        table.save(update_fields=['price_quantity_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_pricequantitytable_json_and_levels'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_migrate_price_quantity_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='pricequantitytable',
+            name='price_quantity_data',
+        ),
+        migrations.RenameField(
+            model_name='pricequantitytable',
+            old_name='price_quantity_json',
+            new_name='price_quantity_data',
+        ),
+        migrations.AlterField(
+            model_name='pricequantitytable',
+            name='price_quantity_data',
+            field=models.JSONField(),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_strategy(apps, schema_editor):
+    """Copies level.strategy onto every existing order attached to a level."""
+    Orders = apps.get_model('accounts', 'Orders')
+    OrderLevel = apps.get_model('accounts', 'OrderLevel')
+
+    Orders.objects.filter(level__isnull=False).update(
+        strategy_id=Subquery(OrderLevel.objects.filter(pk=OuterRef('level_id')).values('strategy_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_pricequantitytable_price_quantity_data_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orders',
+            name='strategy',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='accounts.orderstrategy'),
+        ),
+        migrations.RunPython(backfill_strategy, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['level', 'is_complete', 'is_main', 'exit_order_id', 'is_entry', 'entry_order_status', 'entry_order_id'], name='orders_level_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['strategy', 'is_complete', 'exit_order_id', 'entry_order_status'], name='orders_strategy_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['entry_order_id', 'is_complete'], name='orders_entry_order_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['exit_order_id', 'is_complete'], name='orders_exit_order_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_orders_strategy_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orders',
+            name='journal_key',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
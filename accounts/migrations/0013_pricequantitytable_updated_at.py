@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_orders_journal_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricequantitytable',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
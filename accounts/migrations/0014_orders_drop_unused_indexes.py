@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_pricequantitytable_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orders',
+            name='orders_exit_order_id_idx',
+        ),
+        migrations.AlterField(
+            model_name='orders',
+            name='level',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='accounts.orderlevel'),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.contrib.auth.hashers import make_password, check_password
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 
@@ -74,7 +74,9 @@ class Orders(models.Model):
         (3, 'CANCELLED')
     ]
 
-    level = models.ForeignKey(OrderLevel, on_delete=models.CASCADE, null=True, blank=True)
+    level = models.ForeignKey(OrderLevel, on_delete=models.CASCADE, null=True, blank=True, db_index=False)  # Indexed by orders_level_open_idx
+    # Copy of level.strategy (or the owning strategy of level-less orders) so lookups don't need the join
+    strategy = models.ForeignKey(OrderStrategy, related_name='orders', on_delete=models.CASCADE, null=True, blank=True, db_index=False)  # Indexed by orders_strategy_open_idx
     entry_order_id = models.CharField(max_length=100, null=True, blank=True)
     entry_order_status = models.IntegerField(choices=order_status_choices, default=0)
     order_side = models.CharField(max_length=10, null=True, blank=True)  # 'buy' or 'sell'
@@ -88,6 +90,18 @@ class Orders(models.Model):
     entry_time = models.DateTimeField(default=timezone.now)
     exit_time = models.DateTimeField(null=True, blank=True)
     is_main = models.BooleanField(default=True)
+    # Identifies the row in the order journal, so replaying it after a crash is idempotent
+    journal_key = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Open orders of a level; also covers the dashboard's entry_order_id subqueries
+            models.Index(fields=['level', 'is_complete', 'is_main', 'exit_order_id', 'is_entry', 'entry_order_status', 'entry_order_id'], name='orders_level_open_idx'),
+            # Open/pending orders of a strategy (OpenOrderBook.load, Buy/Sell cancel_orders)
+            models.Index(fields=['strategy', 'is_complete', 'exit_order_id', 'entry_order_status'], name='orders_strategy_open_idx'),
+            # Lookups by broker entry order id (Buy/Sell cancellations); the ladder engine finds orders in its OpenOrderBook
+            models.Index(fields=['entry_order_id', 'is_complete'], name='orders_entry_order_id_idx'),
+        ]
 
 
 def __str__(self):
@@ -95,14 +109,48 @@ def __str__(self):
 
 
 class PriceQuantityTable(models.Model):
+    table_type_choices = [
+        ('ladder', 'Ladder'),
+        ('buy_sell', 'Buy/Sell'),
+    ]
+
     name = models.CharField(max_length=255)
-    price_quantity_data = models.TextField()  # Storing the dictionary as a string
+    price_quantity_data = models.JSONField()  # Validated against the schema of table_type/schema_version on write
+    table_type = models.CharField(max_length=20, choices=table_type_choices, default='ladder')
+    schema_version = models.PositiveSmallIntegerField(default=1)  # 0 = legacy data that matches no schema
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Version of the data for TableSpecCache
+
+    def save(self, *args, **kwargs):
+        # The level rows are rebuilt by a post_save handler (accounts.signals) in the same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name}"
 
 
+class PriceQuantityLevel(models.Model):
+    """One level of a ladder table, normalised out of `PriceQuantityTable.price_quantity_data`."""
+    table = models.ForeignKey(PriceQuantityTable, related_name='levels', on_delete=models.CASCADE)
+    level_number = models.IntegerField()
+    main_percentage = models.FloatField()
+    main_quantity = models.FloatField()
+    main_target = models.FloatField()
+    hedge_percentage = models.FloatField(null=True, blank=True)
+    hedge_market_quantity = models.FloatField(null=True, blank=True)
+    hedge_limit_quantity = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'level_number'], name='unique_table_level_number'),
+        ]
+        ordering = ['table', 'level_number']
+
+    def __str__(self):
+        return f"Table {self.table_id} | Level {self.level_number}"
+
+
 class AccessToken(models.Model):
     timestamp_created = models.DateTimeField(default=timezone.now)
     access_token = models.CharField(max_length=1000)
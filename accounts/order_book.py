@@ -0,0 +1,133 @@
+import threading
+
+from accounts.models import Orders
+from accounts.order_journal import journal_key, journal_record, order_journal
+
+
+class OpenOrderBook:
+    """
+    Authoritative in-memory copy of the open (incomplete) `Orders` rows of one strategy.
+
+    Orders are indexed by broker order id (entry and exit) and by (level id, is_main), so
+    placement, fill and cancel handling never read from the database. Changes are applied
+    to the in-memory rows first and written behind: `flush` journals every row changed since
+    the last flush (see `OrderJournal`), and the strategy calls it once its next orders are
+    armed. The database is updated from the journal in the background.
+
+    The book is owned by the strategy thread; the lock only makes `flush` and `snapshot`
+    safe to call from elsewhere.
+    """
+
+    def __init__(self, strategy_id):
+        self.strategy_id = strategy_id
+        self.lock = threading.Lock()
+        self._by_order_id = {}
+        self._by_level = {}  # (level id, is_main) -> open orders in placement order
+        self._dirty = {}  # journal key -> order changed since the last flush
+
+    def load(self):
+        """
+        Replaces the book with the open orders of the strategy.
+
+        Rows are read from the database, with the changes the journal has not written yet
+        (e.g. those of an earlier run of the strategy) applied on top.
+        """
+        orders = list(Orders.objects.filter(strategy_id=self.strategy_id, is_complete=False).order_by('id'))
+        pending = order_journal.pending_orders(self.strategy_id)
+        if pending:
+            pending_pks = {order.pk for order in pending if order.pk}
+            pending_keys = {order.journal_key for order in pending}
+            orders = [order for order in orders if order.pk not in pending_pks and order.journal_key not in pending_keys]
+            orders += [order for order in pending if not order.is_complete]
+        with self.lock:
+            self._by_order_id.clear()
+            self._by_level.clear()
+            for order in orders:
+                self._index(order)
+            return sum(len(level_orders) for level_orders in self._by_level.values())
+
+    def get(self, order_id):
+        """Returns the open order whose entry or exit broker id is `order_id`, or None."""
+        with self.lock:
+            return self._by_order_id.get(order_id)
+
+    def open_position(self, level_id, is_main=True):
+        """Returns the first open order of the level that has an entry and no exit order yet, or None."""
+        with self.lock:
+            for order in self._by_level.get((level_id, is_main), ()):
+                if order.entry_order_id and not order.exit_order_id:
+                    return order
+        return None
+
+    def pending_entries(self):
+        """Returns the open orders whose entry order is still pending at the broker and that have no exit order."""
+        with self.lock:
+            return [
+                order for orders in self._by_level.values() for order in orders
+                if order.entry_order_status == 2 and not order.exit_order_id
+            ]
+
+    def add(self, order):
+        """Adds a newly placed order to the book; it is inserted on the next flush."""
+        with self.lock:
+            self._index(order)
+            self._dirty[journal_key(order)] = order
+
+    def update(self, order, **changes):
+        """
+        Applies field changes to an order of the book and re-indexes it.
+
+        Orders marked complete leave the book once the change is flushed.
+        """
+        with self.lock:
+            self._unindex(order)
+            for field, value in changes.items():
+                setattr(order, field, value)
+            if not order.is_complete:
+                self._index(order)
+            self._dirty[journal_key(order)] = order
+
+    def flush(self):
+        """
+        Journals every order changed since the last flush, returning once the changes are durable.
+
+        Returns:
+            int: Number of rows journaled.
+        """
+        with self.lock:
+            dirty, self._dirty = list(self._dirty.values()), {}
+            records = [journal_record(order) for order in dirty]
+        if not dirty:
+            return 0
+
+        try:
+            order_journal.append(records)
+        except Exception:
+            # Keep the changes for the next flush; newer changes of the same rows win
+            with self.lock:
+                self._dirty = {**{journal_key(order): order for order in dirty}, **self._dirty}
+            raise
+        return len(dirty)
+
+    def snapshot(self):
+        """Returns the open orders of the book, for status reporting."""
+        with self.lock:
+            return [order for orders in self._by_level.values() for order in orders]
+
+    def _index(self, order):
+        """Caller must hold the lock."""
+        for order_id in (order.entry_order_id, order.exit_order_id):
+            if order_id:
+                self._by_order_id[order_id] = order
+        self._by_level.setdefault((order.level_id, order.is_main), []).append(order)
+
+    def _unindex(self, order):
+        """Caller must hold the lock."""
+        for order_id in (order.entry_order_id, order.exit_order_id):
+            if order_id and self._by_order_id.get(order_id) is order:
+                del self._by_order_id[order_id]
+        orders = self._by_level.get((order.level_id, order.is_main))
+        if orders and order in orders:
+            orders.remove(order)
+            if not orders:
+                del self._by_level[(order.level_id, order.is_main)]
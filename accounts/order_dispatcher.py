@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+from accounts.constants import BrokerOrderStatusEnum
+
+
+class _FillWaiter:
+    """A single thread blocked on one or more broker order ids."""
+    __slots__ = ("order_ids", "event", "order_id", "order")
+
+    def __init__(self, order_ids):
+        self.order_ids = tuple(order_ids)
+        self.event = threading.Event()
+        self.order_id = None
+        self.order = None
+
+
+class OrderDispatcher:
+    """
+    Routes order updates from the order websocket to the thread waiting on that order id.
+
+    Waiters are woken directly from the websocket callback, so a fill reaches the owning
+    strategy as soon as it is received. Fills nobody is waiting on yet are kept (bounded by
+    `max_unclaimed`) and handed over as soon as a waiter registers for them, so unrelated
+    or early fills are never discarded.
+    """
+
+    def __init__(self, max_unclaimed=1000):
+        self.max_unclaimed = max_unclaimed
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._unclaimed = OrderedDict()
+
+    def dispatch(self, message):
+        """Handles a parsed `OnOrders` message and wakes the waiter registered for its order id."""
+        if not message or message.get("s") != "ok":
+            return
+
+        order = message.get("orders") or {}
+        order_id = order.get("id")
+        if not order_id or order.get("status") != BrokerOrderStatusEnum.TRADED.value:
+            return
+
+        with self._lock:
+            waiter = self._waiters.get(order_id)
+            if waiter is None:
+                self._unclaimed[order_id] = order
+                self._unclaimed.move_to_end(order_id)
+                while len(self._unclaimed) > self.max_unclaimed:
+                    self._unclaimed.popitem(last=False)
+                return
+
+            self._release(waiter)
+            waiter.order_id = order_id
+            waiter.order = order
+
+        waiter.event.set()
+
+    def await_fill(self, order_id, timeout=None):
+        """
+        Blocks until the given order is filled.
+
+        Args:
+            order_id (str): Broker order id to wait for.
+            timeout (float, optional): Maximum seconds to wait. Waits forever if None.
+
+        Returns:
+            dict or None: The order payload of the fill, or None on timeout.
+        """
+        fill = self.await_any_fill((order_id,), timeout=timeout)
+        return fill[1] if fill else None
+
+    def await_any_fill(self, order_ids, timeout=None):
+        """
+        Blocks until any one of the given orders is filled.
+
+        Args:
+            order_ids (iterable): Broker order ids to wait for. Empty ids are ignored.
+            timeout (float, optional): Maximum seconds to wait. Waits forever if None.
+
+        Returns:
+            tuple or None: (order_id, order payload) of the first fill, or None on timeout.
+        """
+        waiter = _FillWaiter(order_id for order_id in order_ids if order_id)
+
+        with self._lock:
+            for order_id in waiter.order_ids:
+                order = self._unclaimed.pop(order_id, None)
+                if order is not None:
+                    return order_id, order
+            for order_id in waiter.order_ids:
+                self._waiters[order_id] = waiter
+
+        if not waiter.event.wait(timeout):
+            with self._lock:
+                self._release(waiter)
+
+        # The fill may have landed between the timeout and re-acquiring the lock
+        if waiter.order_id is None:
+            return None
+        return waiter.order_id, waiter.order
+
+    def discard(self, *order_ids):
+        """Forgets unclaimed fills for orders nobody will wait on anymore (e.g. cancelled ones)."""
+        with self._lock:
+            for order_id in order_ids:
+                self._unclaimed.pop(order_id, None)
+
+    def _release(self, waiter):
+        """Unregisters a waiter from all of its order ids. Caller must hold the lock."""
+        for order_id in waiter.order_ids:
+            if self._waiters.get(order_id) is waiter:
+                del self._waiters[order_id]
@@ -0,0 +1,309 @@
+import fcntl
+import json
+import os
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, connection, transaction
+
+from accounts.logging_setup import get_strategy_logger
+from accounts.models import Orders
+
+# Orders columns written from the journal; the primary key is resolved from `journal_key`
+JOURNAL_FIELDS = [field for field in Orders._meta.concrete_fields if not field.primary_key]
+_FIELDS_BY_ATTNAME = {field.attname: field for field in JOURNAL_FIELDS}
+
+
+def journal_key(order):
+    """Returns the key that identifies an order row in the journal, assigning one to rows that have none yet."""
+    if order.journal_key is None:
+        order.journal_key = uuid.uuid4()
+    return order.journal_key
+
+
+def journal_record(order):
+    """
+    Returns the journal record of the current state of an order row.
+
+    Records carry the full row, so applying the latest record of a row is enough to
+    bring it up to date, and applying a record twice changes nothing.
+    """
+    return {
+        "pk": order.pk,
+        "key": str(journal_key(order)),
+        "fields": {field.attname: getattr(order, field.attname) for field in JOURNAL_FIELDS},
+    }
+
+
+class OrderJournalLockedError(RuntimeError):
+    """Raised when another process already owns the order journal file."""
+
+
+def _order_from_record(record, pk):
+    fields = {
+        name: None if value is None else _FIELDS_BY_ATTNAME[name].to_python(value)
+        for name, value in record["fields"].items()
+    }
+    order = Orders(**fields)
+    order.pk = pk
+    return order
+
+
+class OrderJournal:
+    """
+    Write-behind journal of `Orders` changes, shared by every strategy of the process.
+
+    `append` writes the changed rows to a local append-only file and returns once they are
+    fsynced; concurrent appends share one fsync (group commit). A background writer then
+    applies them to the database in batches, so strategies never wait on MySQL between two
+    broker calls. After each batch the writer appends a checkpoint with the sequence number
+    it applied up to, and whenever every journaled change is in the database the file is
+    truncated.
+
+    After a crash, `start` replays the changes past the last checkpoint into the database
+    before any strategy loads its open orders. Replay is idempotent: rows are matched on
+    `journal_key`. One process owns the journal file at a time, enforced with an exclusive
+    lock on the file.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.written = threading.Condition(self.lock)
+        self.drained = threading.Condition(self.lock)
+        self.sync_lock = threading.Lock()
+        self.seq = 0
+        self.synced_seq = 0
+        self._pending = []
+        self._file = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.logger = None
+
+    def start(self):
+        """
+        Replays a journal left by a previous run, then starts the background writer. Safe to call repeatedly.
+
+        Raises:
+            OrderJournalLockedError: If another process owns the journal file.
+        """
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self.logger is None:
+                self.logger = get_strategy_logger("OrderJournal")
+            if self._file is None:
+                self._file = self._open_locked(settings.ORDER_JOURNAL_PATH)
+                try:
+                    replayed = self._replay()
+                except Exception:
+                    self._file.close()
+                    self._file = None
+                    raise
+                if replayed:
+                    self.logger.info(f"Replayed {replayed} journaled order changes into the database.")
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="order-journal", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """
+        Stops the background writer and releases the journal file.
+
+        Changes not yet in the database stay in the file and are replayed by the next `start`.
+        """
+        with self.lock:
+            self._stop.set()
+            self.written.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self.lock:
+            if self._file is not None:
+                self._file.close()  # also releases the lock
+            self._file, self._thread = None, None
+            self._pending = []
+            self.seq = self.synced_seq = 0
+
+    def append(self, records):
+        """
+        Journals order records and waits until they are durable on disk.
+
+        Args:
+            records (list): Records built with `journal_record`.
+
+        Returns:
+            int: Sequence number of the last record appended.
+        """
+        if not records:
+            return self.seq
+
+        self.start()
+        with self.lock:
+            if self._file is None:
+                raise RuntimeError("Order journal is closed.")
+            for record in records:
+                self.seq += 1
+                record["seq"] = self.seq
+                self._file.write(json.dumps(record, cls=DjangoJSONEncoder) + "\n")
+            self._file.flush()
+            seq = self.seq
+            self._pending.extend(records)
+            self.written.notify()
+
+        self._sync(seq)
+        return seq
+
+    def pending_orders(self, strategy_id):
+        """
+        Returns the latest journaled state of the rows of a strategy that are not in the database yet.
+
+        Lets a strategy load its open orders without waiting for the writer (see `OpenOrderBook.load`).
+        """
+        with self.lock:
+            latest = {}
+            for record in self._pending:
+                if record["fields"]["strategy_id"] == strategy_id:
+                    latest[record["key"]] = record
+            return [_order_from_record(record, record["pk"]) for record in latest.values()]
+
+    def pending_count(self):
+        with self.lock:
+            return len(self._pending)
+
+    def drain(self, timeout=None):
+        """
+        Waits until every journaled change is in the database.
+
+        Returns:
+            bool: False if changes were still pending when the timeout expired.
+        """
+        with self.lock:
+            return self.drained.wait_for(lambda: not self._pending, timeout)
+
+    def _sync(self, seq):
+        """fsyncs the journal up to at least `seq`; an fsync started by another thread may already cover it."""
+        with self.sync_lock:
+            if self.synced_seq >= seq:
+                return
+            with self.lock:
+                written_seq = self.seq
+                fd = self._file.fileno()
+            os.fsync(fd)
+            self.synced_seq = written_seq
+
+    def _open_locked(self, path):
+        """Opens the journal for appending and takes an exclusive lock on it. Caller must hold the lock."""
+        journal = open(path, "a+", encoding="utf-8")
+        try:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            journal.close()
+            raise OrderJournalLockedError(f"Order journal {path} is in use by another process.") from e
+        return journal
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.lock:
+                while not self._pending and not self._stop.is_set():
+                    self.written.wait()
+            # Let changes of other strategies join the batch
+            if self._stop.wait(settings.ORDER_JOURNAL_WRITE_INTERVAL):
+                break
+
+            with self.lock:
+                batch = self._pending[:settings.ORDER_JOURNAL_BATCH_SIZE]
+            # The writer outlives any single database connection; drop one the server closed
+            close_old_connections()
+            try:
+                self._apply(batch)
+            except Exception as e:
+                self.logger.error(f"Failed to write {len(batch)} journaled order changes, retrying: {e}")
+                connection.close()
+                self._stop.wait(settings.ORDER_JOURNAL_WRITE_INTERVAL)
+                continue
+
+            with self.lock:
+                del self._pending[:len(batch)]
+                if self._pending:
+                    self._checkpoint(batch[-1]["seq"])
+                else:
+                    self._compact()
+                    self.drained.notify_all()
+        connection.close()
+
+    def _apply(self, records):
+        """Writes the latest state of every row in the records to the database."""
+        latest = {}
+        for record in records:
+            latest[record["key"]] = record
+
+        unresolved = [key for key, record in latest.items() if record["pk"] is None]
+        pks = dict(Orders.objects.filter(journal_key__in=unresolved).values_list("journal_key", "pk")) if unresolved else {}
+        pks = {str(key): pk for key, pk in pks.items()}
+
+        updates, creates = [], []
+        for key, record in latest.items():
+            pk = record["pk"] or pks.get(key)
+            (updates if pk else creates).append(_order_from_record(record, pk))
+
+        try:
+            with transaction.atomic():
+                if updates:
+                    Orders.objects.bulk_update(updates, [field.attname for field in JOURNAL_FIELDS])
+                if creates:
+                    Orders.objects.bulk_create(creates)
+        except IntegrityError:
+            # A row the batch refers to is gone (e.g. its level was deleted); write the rest one by one
+            for order in updates + creates:
+                try:
+                    order.save()
+                except IntegrityError as e:
+                    self.logger.error(f"Dropping journaled change of order {order.journal_key}: {e}")
+
+    def _checkpoint(self, seq):
+        """
+        Marks every record up to `seq` as written to the database, so replay skips them. Caller must hold the lock.
+
+        Not fsynced on its own: a lost checkpoint only makes replay write those rows again.
+        """
+        self._file.write(json.dumps({"applied": seq}) + "\n")
+        self._file.flush()
+
+    def _compact(self):
+        """Truncates the journal once everything in it is in the database. Caller must hold the lock."""
+        self._file.truncate(0)
+        self._file.seek(0)
+        os.fsync(self._file.fileno())
+
+    def _replay(self):
+        """Applies the changes left in the journal by a previous run and empties it. Caller must hold the lock."""
+        self._file.seek(0)
+        records, applied = [], 0
+        for line in self._file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from the crash was never acknowledged to the strategy
+                self.logger.warning("Skipping incomplete journal record.")
+                continue
+            if "applied" in record:
+                applied = max(applied, record["applied"])
+            else:
+                records.append(record)
+
+        # Only the latest change of each row past the last checkpoint is written
+        latest = {}
+        for record in records:
+            if record["seq"] > applied:
+                latest.pop(record["key"], None)
+                latest[record["key"]] = record
+        pending = list(latest.values())
+        for start in range(0, len(pending), settings.ORDER_JOURNAL_BATCH_SIZE):
+            self._apply(pending[start:start + settings.ORDER_JOURNAL_BATCH_SIZE])
+        self._compact()
+        return len(pending)
+
+
+order_journal = OrderJournal()
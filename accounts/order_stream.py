@@ -0,0 +1,100 @@
+import threading
+
+from accounts.fill_cache import FillPriceCache
+from accounts.logging_setup import get_strategy_logger
+from accounts.order_dispatcher import OrderDispatcher
+from accounts.websocket_handler import FyersWebSocketManager
+
+
+class OrderStreamHub:
+    """
+    Process-wide owner of the single order websocket shared by every running strategy.
+
+    Each message is routed by order id through one shared `OrderDispatcher` and fanned out
+    to the optional callback of every subscriber. Traded prices from order and trade updates
+    are kept in `fill_prices`. Subscriptions are reference counted by
+    subscriber key: the socket is opened by the first subscriber and closed when the last
+    one leaves.
+    """
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(OrderStreamHub, cls).__new__(cls, *args, **kwargs)
+            cls._instance.__initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if not self.__initialized:
+            self.lock = threading.Lock()
+            self.dispatcher = OrderDispatcher()
+            self.fill_prices = FillPriceCache()
+            self.subscribers = {}
+            self.ws_client = None
+            self.access_token = None
+            self.logger = get_strategy_logger("OrderStream")
+            self.__initialized = True
+
+    def subscribe(self, key, access_token, callback=None):
+        """
+        Registers a subscriber, starting the shared socket if it is not running yet.
+
+        Args:
+            key (str): Unique subscriber key, e.g. "strategy-12".
+            access_token (str): Broker access token. A different token than the one the
+                                socket was opened with reconnects it using the new token.
+            callback (callable, optional): Called with every raw order message.
+
+        Returns:
+            OrderDispatcher: The shared dispatcher to wait on order fills with.
+        """
+        with self.lock:
+            self.subscribers[key] = callback
+            if self.ws_client is None or access_token != self.access_token:
+                self._restart(access_token)
+            self.logger.info(f"Subscriber {key} added. Active subscribers: {len(self.subscribers)}")
+        return self.dispatcher
+
+    def unsubscribe(self, key):
+        """Removes a subscriber and closes the socket once nobody is subscribed."""
+        with self.lock:
+            if key in self.subscribers:
+                del self.subscribers[key]
+                self.logger.info(f"Subscriber {key} removed. Active subscribers: {len(self.subscribers)}")
+            if not self.subscribers and self.ws_client:
+                self.logger.info("No subscribers left. Closing order stream.")
+                self.ws_client.stop()
+                self.ws_client = None
+                self.access_token = None
+
+    @property
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def publish(self, message):
+        """Routes a message received on the socket to the dispatcher and every subscriber."""
+        self.fill_prices.record_order(message)
+        self.dispatcher.dispatch(message)
+
+        for key, callback in list(self.subscribers.items()):
+            if callback is None:
+                continue
+            try:
+                callback(message)
+            except Exception as e:
+                self.logger.error(f"Order stream subscriber {key} failed to handle message: {e}")
+
+    def publish_trade(self, message):
+        """Records the price of a trade received on the socket."""
+        self.fill_prices.record_trade(message)
+
+    def _restart(self, access_token):
+        """(Re)opens the shared socket with the given token. Caller must hold the lock."""
+        if self.ws_client:
+            self.logger.info("Access token changed. Reconnecting order stream.")
+            self.ws_client.stop()
+
+        self.access_token = access_token
+        self.ws_client = FyersWebSocketManager(access_token, self.logger, on_order=self.publish, on_trade=self.publish_trade)
+        self.ws_client.start()
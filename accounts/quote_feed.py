@@ -0,0 +1,115 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from accounts.broker_client import get_fyers_client
+from accounts.logging_setup import get_strategy_logger
+from accounts.market_data import fetch_quotes
+
+
+class QuoteFeed:
+    """
+    Process-wide latest quotes of every symbol shown on a dashboard.
+
+    Views subscribe the symbols they display and read quotes from memory. A single
+    background poller refreshes all subscribed symbols every `QUOTE_FEED_POLL_INTERVAL`
+    seconds with one batched `quotes` call, so broker load depends on the number of
+    distinct symbols and not on the number of open dashboards. Symbols nobody asked for
+    within `QUOTE_FEED_IDLE_TIMEOUT` seconds are dropped from the poll.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.updated = threading.Condition(self.lock)
+        self.wakeup = threading.Event()
+        self._subscriptions = {}  # symbol -> last time it was requested
+        self._quotes = {}  # symbol -> (received at, quote values)
+        self._thread = None
+        self.logger = None
+
+    def subscribe(self, symbols):
+        """Adds the symbols to the poll, or keeps them in it, starting the poller if needed."""
+        now = time.monotonic()
+        with self.lock:
+            is_new = False
+            for symbol in symbols:
+                if symbol:
+                    is_new = is_new or symbol not in self._subscriptions
+                    self._subscriptions[symbol] = now
+            if self._thread is None or not self._thread.is_alive():
+                self._start()
+        if is_new:
+            self.wakeup.set()  # Don't make new symbols wait for the next poll
+
+    def get_many(self, symbols, timeout=0):
+        """
+        Returns the latest quotes of the symbols.
+
+        Args:
+            symbols (iterable): Symbols to look up.
+            timeout (float): Seconds to wait for a poll if some symbols have no quote yet.
+
+        Returns:
+            dict: Symbol to quote values. Symbols without a quote, or with one older than
+            `QUOTE_FEED_MAX_AGE` seconds, are left out.
+        """
+        symbols = [symbol for symbol in symbols if symbol]
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                quotes = self._fresh(symbols)
+                remaining = deadline - time.monotonic()
+                if len(quotes) == len(set(symbols)) or remaining <= 0:
+                    return quotes
+                self.updated.wait(remaining)
+
+    def _fresh(self, symbols):
+        """Caller must hold the lock."""
+        oldest = time.monotonic() - settings.QUOTE_FEED_MAX_AGE
+        return {
+            symbol: self._quotes[symbol][1]
+            for symbol in symbols
+            if symbol in self._quotes and self._quotes[symbol][0] >= oldest
+        }
+
+    def _start(self):
+        """Caller must hold the lock."""
+        if self.logger is None:
+            self.logger = get_strategy_logger("QuoteFeed")
+        self._thread = threading.Thread(target=self._run, name="quote-feed", daemon=True)
+        self._thread.start()
+        self.logger.info("Quote feed started.")
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(settings.QUOTE_FEED_POLL_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self._poll()
+            except Exception as e:
+                self.logger.error(f"Quote poll failed: {e}")
+
+    def _poll(self):
+        # The access token lookup reads the database; drop a connection the server closed meanwhile
+        close_old_connections()
+        idle_since = time.monotonic() - settings.QUOTE_FEED_IDLE_TIMEOUT
+        with self.lock:
+            for symbol in [symbol for symbol, requested_at in self._subscriptions.items() if requested_at < idle_since]:
+                del self._subscriptions[symbol]
+                self._quotes.pop(symbol, None)
+            symbols = list(self._subscriptions)
+
+        if not symbols:
+            return
+
+        quotes = fetch_quotes(get_fyers_client(), symbols)
+        received_at = time.monotonic()
+        with self.lock:
+            for symbol, values in quotes.items():
+                self._quotes[symbol] = (received_at, values)
+            self.updated.notify_all()
+
+
+quote_feed = QuoteFeed()
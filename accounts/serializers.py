@@ -1,9 +1,9 @@
-import json
-
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import validate_email
 from rest_framework import serializers
+from .constants import PriceQuantityTableTypeEnum
 from .models import Customer, PriceQuantityTable
+from .table_schema import TableSchemaError, create_price_quantity_table, validate_table_data
 from django.core.exceptions import ValidationError as DjangoValidationError
 
 from rest_framework import serializers
@@ -93,10 +93,20 @@ class PriceQuantitySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = PriceQuantityTable
-        fields = ['name', 'price_quantity_data']
+        fields = ['name', 'price_quantity_data', 'table_type']
+
+    def validate(self, attrs):
+        table_type = attrs.get('table_type', PriceQuantityTableTypeEnum.LADDER.value)
+        try:
+            validate_table_data(attrs['price_quantity_data'], table_type)
+        except TableSchemaError as e:
+            raise serializers.ValidationError({'price_quantity_data': str(e)})
+        return attrs
 
     def create(self, validated_data):
-        print('validated data', validated_data)
-        # Save the dictionary as a JSON string in the model
-        validated_data['price_quantity_data'] = json.dumps(validated_data['price_quantity_data'])
-        return super().create(validated_data)
+        # Stored as native JSON together with its level rows
+        return create_price_quantity_table(
+            validated_data['name'],
+            validated_data['price_quantity_data'],
+            table_type=validated_data.get('table_type', PriceQuantityTableTypeEnum.LADDER.value),
+        )
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import AccessToken, PriceQuantityTable
+from .table_schema import rebuild_levels
+from .table_spec import table_spec_cache
+from .token_provider import access_token_provider
+
+
+@receiver(post_save, sender=AccessToken)
+@receiver(post_delete, sender=AccessToken)
+def invalidate_access_token(sender, **kwargs):
+    """Makes the token provider pick up a newly generated or removed access token."""
+    access_token_provider.invalidate()
+
+
+@receiver(post_save, sender=PriceQuantityTable)
+@receiver(post_delete, sender=PriceQuantityTable)
+def invalidate_table_spec(sender, instance, **kwargs):
+    """Drops the parsed form of a table that was edited or removed."""
+    table_spec_cache.invalidate(instance.id)
+
+
+# Fields the level rows are built from; saves limited to other fields keep the rows
+_LEVEL_SOURCE_FIELDS = {'price_quantity_data', 'table_type', 'schema_version'}
+
+
+@receiver(post_save, sender=PriceQuantityTable)
+def rebuild_table_levels(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Rebuilds the level rows of a saved table; `PriceQuantityTable.save` runs this in its transaction."""
+    if raw or (update_fields is not None and not _LEVEL_SOURCE_FIELDS & set(update_fields)):
+        return
+    rebuild_levels(instance)
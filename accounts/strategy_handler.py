@@ -1,5 +1,7 @@
 import threading
 
+from accounts.order_journal import order_journal
+
 
 class StrategyManager:
     _instance = None
@@ -21,6 +23,11 @@ class StrategyManager:
             if strategy_id in self.strategies:
                 raise ValueError(f"Strategy with ID {strategy_id} is already running.")
 
+            # The journal is shared by every strategy of the process: the first start replays a
+            # crashed run's changes into the database, later ones are no-ops. Raises
+            # OrderJournalLockedError if another process owns the journal.
+            order_journal.start()
+
             # Create strategy instance
             strategy_instance = strategy_class(strategy_parameters)
             thread = threading.Thread(target=strategy_instance.run_strategy, daemon=True)
@@ -63,4 +70,9 @@ class StrategyManager:
             return {
                 "is_active": strategy_instance.is_active,
                 "parameters": strategy_instance.strategy_parameters,
+                "state": strategy_instance.state.value if strategy_instance.state else None,
+                "transition_count": strategy_instance.transition_count,
+                "transitions": {f"{from_state}->{to_state}": count for (from_state, to_state), count in strategy_instance.transition_counts.items()},
+                "rollover_latency": strategy_instance.rollover_latency_stats(),
+                "cancel_latency": strategy_instance.cancel_latency_stats(),
             }
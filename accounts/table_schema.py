@@ -0,0 +1,149 @@
+import fastjsonschema
+from django.db import transaction
+
+from .constants import PriceQuantityTableTypeEnum
+from .models import PriceQuantityLevel, PriceQuantityTable
+
+# Version written with every new table; bump it and add the new schemas when the table format changes
+CURRENT_SCHEMA_VERSION = 1
+
+_LEVEL_KEY = "^-?[0-9]+$"
+_NUMBER = {"type": "number"}
+_QUANTITY = {"type": "number", "minimum": 0}
+
+LADDER_SCHEMA_V1 = {
+    "type": "object",
+    "minProperties": 1,
+    "propertyNames": {"pattern": _LEVEL_KEY},
+    "additionalProperties": {
+        "type": "object",
+        "required": ["main_percentage", "main_quantity", "main_target"],
+        "properties": {
+            "main_percentage": _NUMBER,
+            "main_quantity": _QUANTITY,
+            "main_target": _NUMBER,
+            "hedge_percentage": _NUMBER,
+            "hedge_market_quantity": _QUANTITY,
+            "hedge_limit_quantity": _QUANTITY,
+        },
+    },
+}
+
+BUY_SELL_SCHEMA_V1 = {
+    "type": "object",
+    "minProperties": 1,
+    "propertyNames": {"pattern": _LEVEL_KEY},
+    "additionalProperties": {
+        "type": "object",
+        "required": ["call_quantity", "put_quantity"],
+        "properties": {
+            "call_quantity": _QUANTITY,
+            "put_quantity": _QUANTITY,
+            "call_price": _NUMBER,
+            "put_price": _NUMBER,
+        },
+    },
+}
+
+TABLE_SCHEMAS = {
+    (PriceQuantityTableTypeEnum.LADDER.value, 1): LADDER_SCHEMA_V1,
+    (PriceQuantityTableTypeEnum.BUY_SELL.value, 1): BUY_SELL_SCHEMA_V1,
+}
+
+_validators = {key: fastjsonschema.compile(schema) for key, schema in TABLE_SCHEMAS.items()}
+
+
+class TableSchemaError(ValueError):
+    pass
+
+
+def validate_table_data(data, table_type, schema_version=CURRENT_SCHEMA_VERSION):
+    """
+    Validates table data against the schema of its type and version.
+
+    Args:
+        data (dict): Level number (str) to level settings.
+        table_type (str): A `PriceQuantityTableTypeEnum` value.
+        schema_version (int): Schema version the data is written with.
+
+    Returns:
+        dict: The validated data.
+
+    Raises:
+        TableSchemaError: If there is no such schema or the data does not match it.
+    """
+    validator = _validators.get((table_type, schema_version))
+    if validator is None:
+        raise TableSchemaError(f"Unknown table schema: {table_type} v{schema_version}")
+    try:
+        return validator(data)
+    except fastjsonschema.JsonSchemaValueException as e:
+        raise TableSchemaError(f"Invalid {table_type} table: {e.message}")
+
+
+def detect_table_type(data):
+    """Returns the type of table the data matches with the current schema, or None if it matches none."""
+    for table_type in PriceQuantityTableTypeEnum:
+        try:
+            validate_table_data(data, table_type.value)
+            return table_type.value
+        except TableSchemaError:
+            continue
+    return None
+
+
+def level_rows(data):
+    """
+    Returns the `PriceQuantityLevel` field values of every level of ladder table data.
+
+    Returns:
+        list: One dict per level, in stored order.
+    """
+    return [{
+        "level_number": int(key),
+        "main_percentage": level["main_percentage"],
+        "main_quantity": level["main_quantity"],
+        "main_target": level["main_target"],
+        "hedge_percentage": level.get("hedge_percentage"),
+        "hedge_market_quantity": level.get("hedge_market_quantity"),
+        "hedge_limit_quantity": level.get("hedge_limit_quantity"),
+    } for key, level in data.items()]
+
+
+def rebuild_levels(table):
+    """
+    Replaces the `PriceQuantityLevel` rows of a table with the levels of its current data.
+
+    Only ladder tables with a known schema have level rows; their data is validated first.
+
+    Raises:
+        TableSchemaError: If the data does not match the schema of the table.
+    """
+    is_ladder = table.table_type == PriceQuantityTableTypeEnum.LADDER.value and table.schema_version
+    if is_ladder:
+        validate_table_data(table.price_quantity_data, table.table_type, table.schema_version)
+    with transaction.atomic():
+        PriceQuantityLevel.objects.filter(table=table).delete()
+        if is_ladder:
+            PriceQuantityLevel.objects.bulk_create([PriceQuantityLevel(table=table, **row) for row in level_rows(table.price_quantity_data)])
+
+
+def create_price_quantity_table(name, data, table_type=PriceQuantityTableTypeEnum.LADDER.value):
+    """
+    Validates table data and stores it; its level rows are built on save (see `rebuild_levels`).
+
+    Args:
+        name (str): Table name.
+        data (dict): Level number (str) to level settings.
+        table_type (str): A `PriceQuantityTableTypeEnum` value.
+
+    Returns:
+        PriceQuantityTable: The created table.
+
+    Raises:
+        TableSchemaError: If the data does not match the current schema of the table type.
+    """
+    validate_table_data(data, table_type)
+    return PriceQuantityTable.objects.create(
+        name=name, price_quantity_data=data, table_type=table_type, schema_version=CURRENT_SCHEMA_VERSION,
+    )
@@ -0,0 +1,98 @@
+import threading
+from types import MappingProxyType
+
+import numpy as np
+
+# Level fields exposed as typed arrays, in the units stored in the table
+LADDER_FIELDS = (
+    "main_percentage", "main_quantity", "main_target",
+    "hedge_percentage", "hedge_market_quantity", "hedge_limit_quantity",
+)
+
+
+def _readonly(values):
+    array = np.array(values, dtype=np.float64)
+    array.flags.writeable = False
+    return array
+
+
+class TableSpec:
+    """
+    Immutable, validated form of a `PriceQuantityTable`.
+
+    `levels` is a read-only view of the stored JSON (level number as str to level dict),
+    in stored order, for templates and table formats other than the ladder one. The ladder
+    fields of every level are also available as read-only float arrays aligned with
+    `level_numbers`, with NaN where a level does not define the field.
+    """
+    __slots__ = ("table_id", "version", "levels", "level_numbers") + LADDER_FIELDS
+
+    def __init__(self, table_id, version, data):
+        if not isinstance(data, dict):
+            raise ValueError(f"Table {table_id}: expected an object of levels, got {type(data).__name__}.")
+
+        level_numbers = []
+        columns = {field: [] for field in LADDER_FIELDS}
+        for key, level in data.items():
+            if not isinstance(level, dict):
+                raise ValueError(f"Table {table_id}: level {key} is not an object.")
+            try:
+                level_numbers.append(int(key))
+                for field in LADDER_FIELDS:
+                    value = level.get(field)
+                    columns[field].append(np.nan if value is None else float(value))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Table {table_id}: invalid level {key}: {e}")
+
+        set_attribute = super().__setattr__
+        set_attribute("table_id", table_id)
+        set_attribute("version", version)
+        set_attribute("levels", MappingProxyType({key: MappingProxyType(level) for key, level in data.items()}))
+        set_attribute("level_numbers", np.array(level_numbers, dtype=np.int64))
+        self.level_numbers.flags.writeable = False
+        for field in LADDER_FIELDS:
+            set_attribute(field, _readonly(columns[field]))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TableSpec is immutable.")
+
+    def __len__(self):
+        return len(self.level_numbers)
+
+
+class TableSpecCache:
+    """
+    Process-wide cache of parsed tables, keyed by table id and `updated_at`.
+
+    A table's data is validated and converted to arrays once per saved version; a table
+    saved by another process has a newer `updated_at` and is converted again. Saving or
+    deleting a table in this process drops its entry (see `accounts.signals`).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._specs = {}
+
+    def get(self, table):
+        """
+        Returns the `TableSpec` of a `PriceQuantityTable`.
+
+        Raises:
+            ValueError: If the data is not an object of level objects with numeric ladder fields.
+        """
+        with self.lock:
+            spec = self._specs.get(table.id)
+        if spec is not None and spec.version == table.updated_at:
+            return spec
+
+        spec = TableSpec(table.id, table.updated_at, table.price_quantity_data)
+        with self.lock:
+            self._specs[table.id] = spec
+        return spec
+
+    def invalidate(self, table_id):
+        with self.lock:
+            self._specs.pop(table_id, None)
+
+
+table_spec_cache = TableSpecCache()
@@ -0,0 +1,63 @@
+import threading
+
+from .main_strategy import TradingStrategy1
+from .models import Customer, OrderLevel, OrderStrategy
+from .order_dispatcher import OrderDispatcher
+
+
+class FakeBroker:
+    """
+    Stands in for `FyersModel` without network access, recording the orders it places and cancels.
+
+    Accepts every order `reject` does not match and cancels every order id `fail_cancel`
+    does not match, both for single and multi-order requests.
+    """
+
+    def __init__(self, reject=lambda data: False, fail_cancel=lambda order_id: False):
+        self.reject = reject
+        self.fail_cancel = fail_cancel
+        self.lock = threading.Lock()
+        self.placed = []
+        self.cancelled = []
+
+    def place_order(self, data):
+        with self.lock:
+            if self.reject(data):
+                return {'s': 'error', 'code': -50, 'message': 'Rejected'}
+            self.placed.append(data)
+            return {'s': 'ok', 'id': f'order-{len(self.placed)}'}
+
+    def cancel_order(self, data):
+        with self.lock:
+            if self.fail_cancel(data['id']):
+                return {'s': 'error', 'code': -52, 'message': 'Order already traded'}
+            self.cancelled.append(data['id'])
+        return {'s': 'ok', 'id': data['id']}
+
+    def cancel_basket_orders(self, data):
+        responses = [self.cancel_order(leg) for leg in data]
+        return {'s': 'ok', 'data': [{'statusCode': 200 if response['s'] == 'ok' else 400, 'body': response} for response in responses]}
+
+    def exit_positions(self, data):
+        return {'s': 'ok', 'message': 'No open positions'}
+
+
+def create_strategy(**fields):
+    """Creates an `OrderStrategy` of the test customer; `fields` override the defaults."""
+    customer, _ = Customer.objects.get_or_create(email='test@example.com', defaults={'name': 'test', 'password': 'test'})
+    return OrderStrategy.objects.create(user=customer, **{'main_instrument': 'NSE:TEST', **fields})
+
+
+def create_levels(strategy, count):
+    """Creates the first `count` levels of a strategy's ladder; level n is priced at 100 - n with a target of 101 - n."""
+    return OrderLevel.objects.bulk_create([
+        OrderLevel(strategy=strategy, level_number=number, main_percentage=100 - number, main_quantity=1, main_target=101 - number)
+        for number in range(count)
+    ])
+
+
+def make_trading_strategy(strategy, broker):
+    """Builds a `TradingStrategy1` on the fake broker and a dispatcher of its own, without an order socket."""
+    return TradingStrategy1({
+        'strategy': strategy, 'target': 1, 'hedging_limit_price': 0, 'access_token': 'token', 'index': 'NIFTY', 'expiry': None,
+    }, fyers=broker, order_dispatcher=OrderDispatcher())
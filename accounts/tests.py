@@ -0,0 +1,493 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from .constants import StrategyStateEnum
+from .fill_cache import FillPriceCache
+from .models import Orders
+from .order_book import OpenOrderBook
+from .order_dispatcher import OrderDispatcher
+from .order_journal import OrderJournal, OrderJournalLockedError, journal_record
+from .strategy_handler import StrategyManager
+from .table_schema import TableSchemaError, create_price_quantity_table
+from .test_utils import FakeBroker, create_levels, create_strategy, make_trading_strategy
+from .utils import OrderPlacementError
+
+
+class OrdersQueryPlanTests(TestCase):
+    """
+    Checks that the `Orders` queries of the engine and dashboard are served by the indexes
+    declared on the model, so they stay cheap as the table grows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        strategies = [create_strategy(main_instrument=f'NSE:TEST{number}') for number in range(20)]
+        cls.strategy = strategies[0]
+
+        levels = [level for strategy in strategies for level in create_levels(strategy, 5)]
+        cls.level = levels[0]
+
+        # Mostly completed orders (round trips, or cancelled entries without an exit), the last two of each level still open
+        Orders.objects.bulk_create([
+            Orders(
+                level=level, strategy_id=level.strategy_id, entry_order_id=f'{level.id}-{index}',
+                exit_order_id=f'{level.id}-{index}-exit' if index < 18 and index % 2 == 0 else None,
+                entry_order_status=(1 if index % 2 == 0 else 3) if index < 18 else 2,
+                is_entry=True, is_main=index % 2 == 0, is_complete=index < 18,
+            )
+            for level in levels for index in range(20)
+        ])
+
+        # Give the planner the statistics a production table would have
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE TABLE accounts_orders' if connection.vendor == 'mysql' else 'ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"Expected {index_name} in query plan:\n{plan}")
+
+    def test_dashboard_open_order_subquery(self):
+        queryset = Orders.objects.filter(
+            level=self.level, is_entry=True, is_complete=False, is_main=True, entry_order_status=1
+        ).values('entry_order_id')
+        self.assertUsesIndex(queryset, 'orders_level_open_idx')
+
+    def test_active_orders_of_levels(self):
+        queryset = Orders.objects.filter(level__in=[self.level], entry_order_id__isnull=False)
+        self.assertUsesIndex(queryset, 'orders_level_open_idx')
+
+    def test_open_order_of_level(self):
+        queryset = Orders.objects.filter(level__id=self.level.id, is_entry=True, is_complete=False, is_main=True)
+        self.assertUsesIndex(queryset, 'orders_level_open_idx')
+
+    def test_open_orders_of_strategy(self):
+        queryset = Orders.objects.filter(strategy_id=self.strategy.id, is_complete=False).order_by('id')
+        self.assertUsesIndex(queryset, 'orders_strategy_open_idx')
+
+    def test_pending_orders_of_strategy(self):
+        queryset = Orders.objects.filter(strategy=self.strategy, entry_order_status=2, is_complete=False, exit_order_id__isnull=True)
+        self.assertUsesIndex(queryset, 'orders_strategy_open_idx')
+
+    def test_lookup_by_entry_order_id(self):
+        queryset = Orders.objects.filter(entry_order_id=f'{self.level.id}-18', is_complete=False)
+        self.assertUsesIndex(queryset, 'orders_entry_order_id_idx')
+
+
+class OrderJournalTests(TransactionTestCase):
+    """
+    Checks that journaled order changes reach the database exactly once, including after a
+    crash between the fsync of a change and its database write.
+    """
+
+    def setUp(self):
+        self.strategy = create_strategy()
+        self.level, = create_levels(self.strategy, 1)
+
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        settings_override = override_settings(ORDER_JOURNAL_PATH=self.path, ORDER_JOURNAL_WRITE_INTERVAL=0.01)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def start_journal(self):
+        journal = OrderJournal()
+        journal.start()
+        self.addCleanup(journal.close)
+        return journal
+
+    def new_order(self, entry_order_id):
+        return Orders(level=self.level, strategy=self.strategy, entry_order_id=entry_order_id, entry_order_status=2, is_entry=True)
+
+    def journal_lines(self):
+        with open(self.path, encoding='utf-8') as journal:
+            return [json.loads(line) for line in journal]
+
+    def test_append_is_durable_before_the_database_write(self):
+        with override_settings(ORDER_JOURNAL_WRITE_INTERVAL=60):
+            journal = self.start_journal()
+            seq = journal.append([journal_record(self.new_order('A1')), journal_record(self.new_order('A2'))])
+
+            self.assertEqual(seq, 2)
+            self.assertEqual(journal.synced_seq, 2)
+            self.assertEqual([line['fields']['entry_order_id'] for line in self.journal_lines()], ['A1', 'A2'])
+            self.assertFalse(Orders.objects.exists())
+
+    def test_background_writer_applies_and_truncates(self):
+        journal = self.start_journal()
+        order = self.new_order('B1')
+        journal.append([journal_record(order)])
+        order.entry_order_status = 1
+        journal.append([journal_record(order)])
+
+        self.assertTrue(journal.drain(timeout=5))
+        self.assertEqual(list(Orders.objects.values_list('entry_order_id', 'entry_order_status')), [('B1', 1)])
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_concurrent_appends_share_fsyncs(self):
+        journal = self.start_journal()
+        seqs = []
+
+        def append(thread_number):
+            for index in range(10):
+                seqs.append(journal.append([journal_record(self.new_order(f'{thread_number}-{index}'))]))
+
+        threads = [threading.Thread(target=append, args=(number,)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(seqs), list(range(1, 41)))
+        self.assertEqual(journal.synced_seq, 40)
+        self.assertTrue(journal.drain(timeout=5))
+        self.assertEqual(Orders.objects.count(), 40)
+
+    def test_replay_after_crash_writes_latest_state_once(self):
+        with override_settings(ORDER_JOURNAL_WRITE_INTERVAL=60):
+            crashed = OrderJournal()
+            crashed.start()
+            order = self.new_order('C1')
+            crashed.append([journal_record(order)])
+            order.entry_order_status, order.entry_price = 1, 101.5
+            crashed.append([journal_record(order)])
+            # Stop before the writer applied anything, as a crash would
+            crashed.close()
+        self.assertFalse(Orders.objects.exists())
+        with open(self.path, encoding='utf-8') as journal:
+            crashed_journal = journal.read()
+
+        self.start_journal().close()
+        # Replaying the same journal again, e.g. after a crash during the first replay, changes nothing
+        with open(self.path, 'w', encoding='utf-8') as journal:
+            journal.write(crashed_journal)
+        self.start_journal()
+
+        rows = list(Orders.objects.values_list('entry_order_id', 'entry_order_status', 'entry_price', 'journal_key'))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][:3], ('C1', 1, 101.5))
+        self.assertEqual(rows[0][3], order.journal_key)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_replay_skips_checkpointed_changes(self):
+        order = self.new_order('D1')
+        order.save()
+        stale = journal_record(order)
+        stale['seq'] = 1
+        # The row changed after its journaled change was written and checkpointed
+        Orders.objects.filter(pk=order.pk).update(entry_order_status=3)
+        with open(self.path, 'w', encoding='utf-8') as journal:
+            journal.write(json.dumps(stale, default=str) + '\n' + json.dumps({'applied': 1}) + '\n')
+
+        self.start_journal()
+
+        self.assertEqual(Orders.objects.get(pk=order.pk).entry_order_status, 3)
+
+    def test_journal_is_owned_by_one_process(self):
+        self.start_journal()
+        with self.assertRaises(OrderJournalLockedError):
+            OrderJournal().start()
+
+    def test_no_strategy_starts_while_another_process_owns_the_journal(self):
+        self.start_journal()
+        strategy_class = mock.Mock()
+        manager = StrategyManager()
+
+        with mock.patch('accounts.strategy_handler.order_journal', OrderJournal()):
+            with self.assertRaises(OrderJournalLockedError):
+                manager.start_strategy(self.strategy.id, strategy_class, {})
+
+        strategy_class.assert_not_called()
+        self.assertNotIn(self.strategy.id, manager.list_active_strategies())
+
+
+class PriceQuantityLevelTests(TestCase):
+    """Checks that the level rows of a table always match its stored data."""
+
+    def level_values(self, table):
+        return list(table.levels.values_list('level_number', 'main_percentage', 'main_quantity', 'main_target'))
+
+    def test_levels_are_created_with_the_table(self):
+        table = create_price_quantity_table('ladder', {'1': {'main_percentage': 99, 'main_quantity': 5, 'main_target': 100}})
+        self.assertEqual(self.level_values(table), [(1, 99, 5, 100)])
+
+    def test_levels_are_rebuilt_when_the_data_is_saved(self):
+        table = create_price_quantity_table('ladder', {'1': {'main_percentage': 99, 'main_quantity': 5, 'main_target': 100}})
+        table.price_quantity_data = {
+            '1': {'main_percentage': 98, 'main_quantity': 5, 'main_target': 100},
+            '2': {'main_percentage': 97, 'main_quantity': 10, 'main_target': 99},
+        }
+        table.save()
+        self.assertEqual(self.level_values(table), [(1, 98, 5, 100), (2, 97, 10, 99)])
+
+    def test_invalid_data_is_not_saved(self):
+        data = {'1': {'main_percentage': 99, 'main_quantity': 5, 'main_target': 100}}
+        table = create_price_quantity_table('ladder', data)
+        table.price_quantity_data = {'1': {'main_percentage': 98}}
+        with self.assertRaises(TableSchemaError):
+            table.save()
+
+        table.refresh_from_db()
+        self.assertEqual(table.price_quantity_data, data)
+        self.assertEqual(self.level_values(table), [(1, 99, 5, 100)])
+
+    def test_buy_sell_tables_have_no_levels(self):
+        table = create_price_quantity_table('buy/sell', {'1': {'call_quantity': 1, 'put_quantity': 1}}, table_type='buy_sell')
+        self.assertFalse(table.levels.exists())
+
+
+class FillPriceCacheTests(SimpleTestCase):
+    """Checks that only the price of a complete fill is handed out."""
+
+    @staticmethod
+    def trade(order_id, trade_number, quantity, price):
+        return {'s': 'ok', 'trades': {'orderNumber': order_id, 'tradeNumber': trade_number, 'tradedQty': quantity, 'tradePrice': price}}
+
+    def test_partial_fill_has_no_price(self):
+        fill_prices = FillPriceCache()
+        fill_prices.record_trade(self.trade('1', 'a', 5, 100))
+        self.assertIsNone(fill_prices.get('1', timeout=0.01))
+        self.assertIsNone(fill_prices.get('1', timeout=0.01, quantity=10))
+
+    def test_trades_adding_up_to_the_quantity_are_final(self):
+        fill_prices = FillPriceCache()
+        fill_prices.record_trade(self.trade('1', 'a', 5, 100))
+        fill_prices.record_trade(self.trade('1', 'b', 5, 102))
+        fill_prices.record_trade(self.trade('1', 'b', 5, 102))  # Repeated trade update
+        self.assertEqual(fill_prices.get('1', timeout=0.01, quantity=10), 101)
+
+    def test_traded_order_update_is_final(self):
+        fill_prices = FillPriceCache()
+        fill_prices.record_trade(self.trade('1', 'a', 5, 100))
+        threading.Timer(0.05, fill_prices.record_order, args=({'s': 'ok', 'orders': {'id': '1', 'status': 2, 'tradedPrice': 101.5}},)).start()
+        self.assertEqual(fill_prices.get('1', timeout=2), 101.5)
+
+
+class OpenOrderBookTests(TestCase):
+    """Checks the indexes of the order book and that flush journals every changed row once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.strategy = create_strategy()
+        cls.level, = create_levels(cls.strategy, 1)
+        Orders.objects.bulk_create([
+            Orders(level=cls.level, strategy=cls.strategy, entry_order_id='filled', entry_order_status=1, is_entry=True),
+            Orders(level=cls.level, strategy=cls.strategy, entry_order_id='pending', entry_order_status=2, is_entry=True, is_main=False),
+            Orders(level=cls.level, strategy=cls.strategy, entry_order_id='done', entry_order_status=1, is_complete=True),
+        ])
+
+    def setUp(self):
+        self.book = OpenOrderBook(self.strategy.id)
+        self.book.load()
+        append = mock.patch('accounts.order_book.order_journal.append')
+        self.append = append.start()
+        self.addCleanup(append.stop)
+
+    def journaled(self):
+        return [record for call in self.append.call_args_list for record in call.args[0]]
+
+    def test_load_indexes_open_orders(self):
+        self.assertEqual(len(self.book.snapshot()), 2)
+        self.assertIsNone(self.book.get('done'))
+        self.assertEqual(self.book.open_position(self.level.id).entry_order_id, 'filled')
+        self.assertEqual([order.entry_order_id for order in self.book.pending_entries()], ['pending'])
+
+    def test_load_applies_changes_not_written_yet(self):
+        filled, pending = (Orders.objects.get(entry_order_id=order_id) for order_id in ('filled', 'pending'))
+        filled.is_complete = True
+        pending.entry_order_status = 1
+        new = Orders(level=self.level, strategy=self.strategy, entry_order_id='new', entry_order_status=2)
+        with mock.patch('accounts.order_book.order_journal.pending_orders', return_value=[filled, pending, new]):
+            self.assertEqual(self.book.load(), 2)
+
+        self.assertIsNone(self.book.get('filled'))
+        self.assertEqual(self.book.get('pending').entry_order_status, 1)
+        self.assertIs(self.book.get('new'), new)
+
+    def test_update_reindexes_and_completed_orders_leave(self):
+        order = self.book.get('filled')
+        self.book.update(order, exit_order_id='exit', exit_order_status=2)
+        self.assertIs(self.book.get('exit'), order)
+        self.assertIsNone(self.book.open_position(self.level.id))
+
+        self.book.update(order, is_complete=True)
+        self.assertIsNone(self.book.get('filled'))
+        self.assertIsNone(self.book.get('exit'))
+        self.assertEqual(len(self.book.snapshot()), 1)
+
+    def test_flush_journals_the_latest_state_of_each_row_once(self):
+        order = self.book.get('filled')
+        self.book.update(order, exit_order_id='exit')
+        self.book.update(order, exit_order_status=2)
+        self.book.add(Orders(level=self.level, strategy=self.strategy, entry_order_id='new', entry_order_status=2))
+
+        self.assertEqual(self.book.flush(), 2)
+        records = {record['fields']['entry_order_id']: record for record in self.journaled()}
+        self.assertEqual(records.keys(), {'filled', 'new'})
+        self.assertEqual(records['filled']['fields']['exit_order_status'], 2)
+        self.assertEqual(records['filled']['key'], str(order.journal_key))
+        self.assertEqual(self.book.flush(), 0)
+
+    def test_failed_flush_keeps_changes_and_newer_ones_win(self):
+        order = self.book.get('filled')
+        self.book.update(order, exit_order_id='exit')
+        self.append.side_effect = OSError('disk full')
+        with self.assertRaises(OSError):
+            self.book.flush()
+
+        self.append.side_effect = None
+        self.book.update(order, exit_order_status=2)
+        self.assertEqual(self.book.flush(), 1)
+        record = self.append.call_args.args[0][0]
+        self.assertEqual((record['fields']['exit_order_id'], record['fields']['exit_order_status']), ('exit', 2))
+
+
+class OrderDispatcherTests(SimpleTestCase):
+    """Checks that fills reach the thread waiting on them, whenever they arrive."""
+
+    @staticmethod
+    def update(order_id, status=2):
+        return {'s': 'ok', 'orders': {'id': order_id, 'status': status, 'tradedPrice': 100}}
+
+    def test_fill_wakes_the_waiter(self):
+        dispatcher = OrderDispatcher()
+        threading.Timer(0.05, dispatcher.dispatch, args=(self.update('1'),)).start()
+        self.assertEqual(dispatcher.await_fill('1', timeout=2)['id'], '1')
+
+    def test_fill_before_await_is_handed_over(self):
+        dispatcher = OrderDispatcher()
+        dispatcher.dispatch(self.update('1'))
+        self.assertEqual(dispatcher.await_fill('1', timeout=0)['id'], '1')
+        # Claimed fills are handed out once
+        self.assertIsNone(dispatcher.await_fill('1', timeout=0.01))
+
+    def test_timeout_unregisters_the_waiter(self):
+        dispatcher = OrderDispatcher()
+        self.assertIsNone(dispatcher.await_fill('1', timeout=0.01))
+        self.assertEqual(dispatcher._waiters, {})
+
+        # A late fill is kept for the next waiter instead of going to the timed out one
+        dispatcher.dispatch(self.update('1'))
+        self.assertEqual(dispatcher.await_fill('1', timeout=0)['id'], '1')
+
+    def test_oldest_unclaimed_fills_are_evicted(self):
+        dispatcher = OrderDispatcher(max_unclaimed=2)
+        for order_id in ('1', '2', '3'):
+            dispatcher.dispatch(self.update(order_id))
+
+        self.assertIsNone(dispatcher.await_fill('1', timeout=0))
+        self.assertEqual(dispatcher.await_any_fill(('2', '3'), timeout=0)[0], '2')
+        self.assertEqual(dispatcher.await_fill('3', timeout=0)['id'], '3')
+
+    def test_other_statuses_are_ignored(self):
+        dispatcher = OrderDispatcher()
+        for status in (1, 4, 5, 6):
+            dispatcher.dispatch(self.update('1', status))
+        dispatcher.dispatch({'s': 'error', 'orders': {'id': '1', 'status': 2}})
+
+        self.assertIsNone(dispatcher.await_fill('1', timeout=0.01))
+
+    def test_any_fill_releases_all_order_ids(self):
+        dispatcher = OrderDispatcher()
+        threading.Timer(0.05, dispatcher.dispatch, args=(self.update('2'),)).start()
+        self.assertEqual(dispatcher.await_any_fill(('1', '2'), timeout=2)[0], '2')
+        self.assertEqual(dispatcher._waiters, {})
+
+
+class PlaceLevelOrdersTests(TestCase):
+    """Checks that the orders of a level pair are recorded together or not at all."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.strategy = create_strategy()
+        cls.levels = create_levels(cls.strategy, 2)
+
+    def place_level_pair(self, trading_strategy):
+        return trading_strategy._place_level_orders([(self.levels[0], False), (self.levels[1], True)])
+
+    def test_both_orders_are_recorded(self):
+        broker = FakeBroker()
+        trading_strategy = make_trading_strategy(self.strategy, broker)
+
+        placed = self.place_level_pair(trading_strategy)
+
+        self.assertCountEqual([order_id for _, order_id in placed], ['order-1', 'order-2'])
+        self.assertEqual(len(trading_strategy.order_book.snapshot()), 2)
+        self.assertEqual(broker.cancelled, [])
+
+    def test_rejected_order_rolls_back_the_other(self):
+        # Only the order of the second level (limit price 99) is rejected
+        broker = FakeBroker(reject=lambda data: data['limitPrice'] == 99)
+        trading_strategy = make_trading_strategy(self.strategy, broker)
+
+        with self.assertRaises(OrderPlacementError):
+            self.place_level_pair(trading_strategy)
+
+        self.assertEqual(broker.cancelled, ['order-1'])
+        self.assertEqual(trading_strategy.order_book.snapshot(), [])
+        self.assertEqual(trading_strategy.order_book.flush(), 0)
+        self.assertFalse(Orders.objects.filter(is_complete=False).exists())
+
+
+class RunStrategyTests(TestCase):
+    """Checks that a strategy that cannot start still releases what it holds."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.strategy = create_strategy()
+
+    def test_failed_book_load_stops_and_cleans_up(self):
+        trading_strategy = make_trading_strategy(self.strategy, FakeBroker())
+
+        with mock.patch.object(trading_strategy.order_book, 'load', side_effect=OrderJournalLockedError('locked')), \
+                mock.patch.object(trading_strategy.order_stream, 'unsubscribe') as unsubscribe:
+            trading_strategy.run_strategy()
+
+        self.assertEqual(trading_strategy.state, StrategyStateEnum.STOPPED)
+        self.assertTrue(trading_strategy.stop_event.is_set())
+        unsubscribe.assert_called_once_with(trading_strategy.order_stream_key)
+
+
+@override_settings(FYERS_BASKET_ORDERS=True)
+class CancelPendingOrdersTests(TestCase):
+    """Checks that only the orders the broker cancelled leave the order book."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.strategy = create_strategy()
+        cls.level, = create_levels(cls.strategy, 1)
+
+    def make_strategy(self, broker):
+        trading_strategy = make_trading_strategy(self.strategy, broker)
+        for order_id in ('1', '2', '3'):
+            trading_strategy.order_book.add(Orders(level=self.level, strategy=self.strategy, entry_order_id=order_id, entry_order_status=2, is_entry=True))
+        return trading_strategy
+
+    def test_failed_cancels_stay_open(self):
+        broker = FakeBroker(fail_cancel=lambda order_id: order_id == '2')
+        trading_strategy = self.make_strategy(broker)
+
+        responses = trading_strategy._cancel_pending_orders(trading_strategy.order_book.pending_entries())
+
+        self.assertEqual([response['s'] for response in responses], ['ok', 'error', 'ok'])
+        self.assertEqual(broker.cancelled, ['1', '3'])
+        self.assertEqual([order.entry_order_id for order in trading_strategy.order_book.pending_entries()], ['2'])
+        self.assertEqual((trading_strategy.last_bulk_cancel['orders'], trading_strategy.last_bulk_cancel['failed']), (2, 1))
+        self.assertEqual(len(trading_strategy.cancel_latencies), 2)
+
+    @override_settings(FYERS_BASKET_ORDERS=False)
+    def test_failed_single_cancels_stay_open(self):
+        broker = FakeBroker()
+        broker.cancel_order = mock.Mock(side_effect=[{'s': 'ok', 'id': '1'}, ConnectionError('reset'), 'Bad Gateway'])
+        trading_strategy = self.make_strategy(broker)
+
+        trading_strategy._cancel_pending_orders(trading_strategy.order_book.pending_entries())
+
+        self.assertEqual(len(trading_strategy.order_book.pending_entries()), 2)
+        self.assertEqual((trading_strategy.last_bulk_cancel['orders'], trading_strategy.last_bulk_cancel['failed']), (1, 2))
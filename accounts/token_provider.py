@@ -0,0 +1,49 @@
+import threading
+
+from django.utils import timezone
+
+from .models import AccessToken
+
+
+def delete_old_tokens(today):
+    AccessToken.objects.filter(timestamp_created__date__lt=today).delete()
+
+
+class AccessTokenProvider:
+    """
+    Serves the active broker access token from memory.
+
+    The token is read from the database once and kept until an `AccessToken` is saved or
+    deleted (see `accounts.signals`). Tokens from previous days are deleted on the first
+    lookup of each day instead of on every request.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._token = None
+        self._is_loaded = False
+        self._cleaned_on = None
+
+    def get(self):
+        """Returns the latest active access token, or None if there is none."""
+        today = timezone.now().date()
+        with self.lock:
+            if self._cleaned_on != today:
+                delete_old_tokens(today)
+                self._cleaned_on = today
+                self._is_loaded = False  # The cached token may have been one of the deleted ones
+
+            if not self._is_loaded:
+                access_token = AccessToken.objects.filter(is_active=True).order_by('-timestamp_created').first()
+                self._token = access_token.access_token if access_token else None
+                self._is_loaded = True
+
+            return self._token
+
+    def invalidate(self):
+        """Forces the next lookup to read the token from the database again."""
+        with self.lock:
+            self._is_loaded = False
+
+
+access_token_provider = AccessTokenProvider()
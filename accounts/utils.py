@@ -1,29 +1,23 @@
-import json
 import time
 from functools import wraps
-from django.utils import timezone
+
+import numpy as np
 from django.db import transaction
-from fyers_apiv3 import fyersModel
 
+from .broker_client import get_fyers_client
 from .constants import OPTION_MAPPING, RETRY_ATTEMPTS
-from .models import Customer, OrderLevel, AccessToken
+from .level_ladder import ladder_cache, static_ladder_cache
+from .market_data import option_chain_cache, expiry_calendar
+from .models import Customer, OrderLevel
+from .table_spec import table_spec_cache
+from .token_provider import access_token_provider
 from django.conf import settings
 
 redirect_uri = "http://127.0.0.1:8000/fyers_login"
 
-def delete_old_tokens(today):
-    AccessToken.objects.filter(timestamp_created__date__lt=today).delete()
-
 def get_access_token():
     try:
-        today = timezone.now().date()
-        delete_old_tokens(today)
-        access_tokens = AccessToken.objects.filter(is_active=True).order_by('-timestamp_created')
-
-        if access_tokens.exists():
-            return access_tokens.first().access_token
-        else:
-            return None
+        return access_token_provider.get()
     except Exception as e:
         print(f"Error getting access token: {e}")
         return None
@@ -43,7 +37,7 @@ def get_customer(request):
 
 def get_balance(request):
     access_token = get_access_token()
-    fyers = fyersModel.FyersModel(client_id=settings.FYERS_CLIENT_ID, token=access_token, is_async=False, log_path="")
+    fyers = get_fyers_client(access_token)
     total_balance, utilised_balance, realised_profit_loss, limit_at_start_of_day, available_balance = 0, 0, 0, 0, 0
     if "fund_limit" in fyers.funds():
         funds = fyers.funds()['fund_limit']
@@ -55,45 +49,6 @@ def get_balance(request):
     return total_balance, utilised_balance, realised_profit_loss, limit_at_start_of_day, available_balance
 
 
-def process_option_data(data):
-    data = data[1:]
-    try:
-        # Separate calls and puts
-        calls, puts = [], []
-        for item in data:
-            option_type = item.get('option_type')
-            if option_type == 'CE':
-                calls.append(item)
-            elif option_type == 'PE':
-                puts.append(item)
-            else:
-                raise ValueError(f"Invalid option type: {option_type}")
-
-        if len(calls) != len(puts):
-            raise ValueError("Mismatched call/put data count.")
-
-        # Determine middle index
-        middle_index = len(calls) // 2
-
-        call_dict = {}
-        put_dict = {}
-
-        # Process both calls and puts
-        for i in range(len(calls)):
-            put_index = i - middle_index  # middle = 0, above = positive, below = negative
-            call_index = middle_index - i  # middle = 0, above = negative, below = positive
-
-            # Assign index in dictionaries
-            call_dict[str(call_index)] = calls[i]
-            put_dict[str(put_index)] = puts[i]
-
-        return call_dict, put_dict
-
-    except ValueError as e:
-        print(f"Error: {e}")
-        return {}, {}
-
-
 def get_instrument(index, strike_distance, strike_direction, expiry=None):
     access_token = get_access_token()
 
@@ -123,52 +78,41 @@ def get_instrument(index, strike_distance, strike_direction, expiry=None):
             raise InvalidStrikeDirectionError("Invalid strike direction. Must be 'CALL' or 'PUT'.")
 
         # Initialize Fyers client
-        fyers = fyersModel.FyersModel(
-            client_id=settings.FYERS_CLIENT_ID,
-            token=access_token,
-            is_async=False,
-            log_path=""
-        )
-
-        # Prepare request data
-        data = {
-            "symbol": index,
-            "strikecount": abs(strike_distance) + 1,
-            "timestamp": ""
-        }
-
-        # Fetch initial option chain data
-        initial_response = fyers.optionchain(data=data)
-        if not (initial_response.get('data') and initial_response['data'].get('expiryData')):
-            raise OptionChainDataError("Invalid response or missing expiry data. Regenerate access token.")
-
-        response_expiry = initial_response['data']['expiryData']
+        fyers = get_fyers_client(access_token)
+
+        # Request at least OPTION_CHAIN_MIN_STRIKECOUNT strikes so legs with different
+        # strike distances on the same index and expiry share one cached snapshot
+        strikecount = max(abs(strike_distance) + 1, settings.OPTION_CHAIN_MIN_STRIKECOUNT)
+
+        # An expiry-qualified lookup only needs one call once the expiry map is known for the day
+        response_expiry = expiry_calendar.get(index) if expiry else None
+        if response_expiry is None:
+            # Fetch initial option chain data
+            initial_response = option_chain_cache.get(fyers, index, "", strikecount)
+            if not (initial_response.get('data') and initial_response['data'].get('expiryData')):
+                raise OptionChainDataError("Invalid response or missing expiry data. Regenerate access token.")
+
+            response_expiry = initial_response['data']['expiryData']
+            expiry_calendar.set(index, response_expiry)
 
         # Handle expiry-specific data
+        timestamp = ""
         if expiry:
             if expiry not in response_expiry:
                 raise ExpiryNotFoundError(f"Specified expiry '{expiry}' not found.")
-            data['timestamp'] = response_expiry[expiry]
-            response = fyers.optionchain(data=data)
-        else:
-            response = initial_response
+            timestamp = response_expiry[expiry]
 
-        # Validate options chain data
-        if not (response.get('data') and response['data'].get('optionsChain')):
+        # Indexed chain of the snapshot, shared with every other lookup on it
+        option_chain = option_chain_cache.get_chain(fyers, index, timestamp, strikecount)
+        if option_chain is None:
             raise OptionChainDataError("Invalid response or missing options chain data.")
 
-        # Process options chain data
-        option_chain_data = response['data']['optionsChain']
-        call_options, put_options = process_option_data(option_chain_data)
-
         # Retrieve the relevant option
-        option = call_options.get(str(strike_distance)) if strike_direction == "CE" else put_options.get(str(strike_distance))
+        option = option_chain.get(strike_direction, strike_distance)
         if not option:
             raise ValueError("Specified strike distance not found in the options chain.")
 
-        instrument = option['symbol']
-        price = option['ltp']
-        return instrument, price
+        return option.symbol, option.ltp
 
     except (InvalidStrikeDirectionError, ExpiryNotFoundError, OptionChainDataError, ValueError) as known_error:
         raise
@@ -206,43 +150,78 @@ def get_order_status_value(order_status):
     return order_status
 
 
+def _ladder_prices(spec, main_price, target):
+    """
+    Computes the entry and target price of every level from the table spec in one pass.
+
+    Args:
+        spec (TableSpec): Parsed table.
+        main_price (float): Price of the base level.
+        target (float): Target percentage of the base level.
+
+    Returns:
+        dict: Level number to (main_percentage, main_target); level 0 is the base level.
+    """
+    if np.isnan(spec.main_percentage).any() or np.isnan(spec.main_target).any():
+        raise ValueError(f"Table {spec.table_id} has levels without main_percentage or main_target.")
+
+    prices = (1 - spec.main_percentage / 100) * main_price
+    targets = prices * (1 + spec.main_target / 100)
+
+    level_prices = dict(zip(spec.level_numbers.tolist(), zip(prices.tolist(), targets.tolist())))
+    level_prices[0] = (main_price, (1 + float(target) / 100) * main_price)
+    return level_prices
+
+
+def _native(value, cast=float):
+    """Converts a table spec value to a native int/float for the ORM, with NaN (field not set) as None."""
+    value = float(value)
+    return None if np.isnan(value) else cast(value)
+
+
 def create_table(main_price, target, strategy, hedging_limit_price, quantity=None, table=None, hedging_quantity=None, hedging_limit_quantity=None):
     try:
-        # Parse the JSON data safely
-        parsed_data = json.loads(table.price_quantity_data)
+        # Parsed once per table version
+        spec = table_spec_cache.get(table)
+        main_price = float(main_price)
+        level_prices = _ladder_prices(spec, main_price, target)
+        hedge_percentages = dict(zip(spec.level_numbers.tolist(), spec.hedge_percentage.tolist()))
 
         # Fetch existing order levels
-        existing_levels = OrderLevel.objects.filter(strategy=strategy).order_by("level_number")
+        existing_levels = list(OrderLevel.objects.filter(strategy=strategy).order_by("level_number"))
 
-        if existing_levels.exists():
+        if existing_levels:
             # Update existing levels
+            updated_levels = []
+            for level in existing_levels:
+                if level.level_number not in level_prices:
+                    continue
+
+                level.main_percentage, level.main_target = level_prices[level.level_number]
+                if level.level_number == 0:
+                    # Update the first order (base level)
+                    if hedging_limit_price:
+                        level.hedging_limit_price = (1 - float(hedging_limit_price) / 100) * main_price
+                else:
+                    # Update other levels based on table data
+                    hedge_percentage = hedge_percentages[level.level_number]
+                    if not np.isnan(hedge_percentage):
+                        level.hedging_limit_price = (1 - hedge_percentage / 100) * main_price
+                updated_levels.append(level)
+
+            # One bulk UPDATE instead of a save() per level
             with transaction.atomic():
-                for level in existing_levels:
-                    if level.level_number == 0:
-                        # Update the first order (base level)
-                        level.main_percentage = main_price
-                        level.main_target = (1 + float(target) / 100) * main_price
-                        if hedging_limit_price:
-                            level.hedging_limit_price = (1 - float(hedging_limit_price) / 100) * main_price
-                    else:
-                        # Update other levels based on table data
-                        key = str(level.level_number)
-                        if key in parsed_data:
-                            data = parsed_data[key]
-                            level.main_percentage = (1 - float(data.get('main_percentage')) / 100) * main_price
-                            level.main_target = (1 - float(data.get('main_percentage')) / 100) * (1 + float(data.get('main_target')) / 100) * main_price
-                            if 'hedge_percentage' in data:
-                                level.hedging_limit_price = (1 - float(data['hedge_percentage']) / 100) * main_price
-                    # Save updated level
-                    level.save()
+                OrderLevel.objects.bulk_update(updated_levels, ['main_percentage', 'main_target', 'hedging_limit_price'])
+            ladder_cache.invalidate(strategy.id)
+            static_ladder_cache.invalidate(strategy.id)
             return  # Exit early after updating existing levels
 
         # Prepare a list for bulk_create if no existing levels
         order_levels = [OrderLevel(
             strategy=strategy,
-            main_percentage=main_price,
+            main_percentage=level_prices[0][0],
             main_quantity=quantity,
-            main_target=(1 + float(target) / 100) * main_price,
+            main_target=level_prices[0][1],
             hedging_quantity=hedging_quantity if hedging_quantity else None,
             hedging_limit_price=(1 - float(hedging_limit_price) / 100) * main_price if hedging_limit_price else None,
             hedging_limit_quantity=hedging_limit_quantity if hedging_limit_quantity else None,
@@ -250,25 +229,28 @@ def create_table(main_price, target, strategy, hedging_limit_price, quantity=Non
         )]
 
         # Add levels from table data
-        for key, data in parsed_data.items():
+        for index, level_number in enumerate(spec.level_numbers.tolist()):
+            main_percentage, main_target = level_prices[level_number]
             order_levels.append(OrderLevel(
                 strategy=strategy,
-                main_percentage=(1 - float(data.get('main_percentage')) / 100) * main_price,
-                main_quantity=float(data.get('main_quantity')),
-                main_target=(1 - float(data.get('main_percentage')) / 100) * (1 + float(data.get('main_target')) / 100) * main_price,
-                hedging_quantity=float(data.get('hedge_market_quantity')),
-                hedging_limit_price=float(data.get('hedge_percentage')),
-                hedging_limit_quantity=float(data.get('hedge_limit_quantity')),
-                level_number=int(key),
+                main_percentage=main_percentage,
+                main_quantity=_native(spec.main_quantity[index], int),
+                main_target=main_target,
+                hedging_quantity=_native(spec.hedge_market_quantity[index], int),
+                hedging_limit_price=_native(spec.hedge_percentage[index]),
+                hedging_limit_quantity=_native(spec.hedge_limit_quantity[index], int),
+                level_number=level_number,
             ))
 
         # Bulk create the new order levels
         if order_levels:
             with transaction.atomic():
                 OrderLevel.objects.bulk_create(order_levels)
+            ladder_cache.invalidate(strategy.id)
+            static_ladder_cache.invalidate(strategy.id)
 
-    except json.JSONDecodeError:
-        print("Error decoding JSON data.")
+    except ValueError as e:
+        print(f"Invalid table data: {e}")
     except Exception as e:
         print(f"An error occurred: {e}")
 
@@ -1,24 +1,33 @@
 import json
 import random
+import time
+from collections import defaultdict
 
 from django.conf import settings
 from django.contrib import messages
-from django.core.cache import cache
-from django.db import transaction
+from django.db import close_old_connections, transaction
 from django.db.models import OuterRef, Subquery
 from django.http import HttpResponseBadRequest
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.views import View
 from fyers_apiv3 import fyersModel
 from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 
+from .broker_client import get_fyers_client
 from .forms import OrderStrategyForm, OrderLevelForm
+from .ladder_analytics import LadderAnalytics
+from .level_ladder import ladder_cache, static_ladder_cache
+from .live_updates import live_updates
 from .main_strategy import TradingStrategy1
 from .models import PriceQuantityTable, OrderStrategy, Orders, OrderLevel, AccessToken
+from .quote_feed import quote_feed
 from .serializers import CustomerLoginSerializer
 from .serializers import CustomerRegistrationSerializer
 from .strategy_handler import StrategyManager
+from .table_schema import TableSchemaError, create_price_quantity_table
+from .table_spec import table_spec_cache
 from .utils import get_balance, get_customer, get_instrument, create_table, get_lot_size, get_access_token, redirect_uri, InvalidStrikeDirectionError, ExpiryNotFoundError, OptionChainDataError
 
 
@@ -125,6 +134,8 @@ class HomeView(APIView):
             )
             if level_form.is_valid():
                 level_form.save()
+        ladder_cache.invalidate(strategy.id)
+        static_ladder_cache.invalidate(strategy.id)
 
         return self.get(request)  # Re-render the page
 
@@ -141,12 +152,12 @@ class PlaceOrderView(APIView):
         table_options = {}
 
         for key, table in enumerate(tables):
-            data = json.loads(table.price_quantity_data)
+            spec = table_spec_cache.get(table)
 
             profit = []
             loss = []
 
-            for level_data in data.values():
+            for level_data in spec.levels.values():
                 if 'price' in level_data:
                     price = level_data['price']
                     if price > 0:
@@ -361,11 +372,12 @@ class PriceQuantityAPIView(APIView):
                         'error': f'Invalid data format at entry {i + 1}: {str(e)}'
                     }, status=400)
 
-            # Save to model
-            PriceQuantityTable.objects.create(
-                name=name,
-                price_quantity_data=json.dumps(values_data)
-            )
+            # Validate once and save with the normalised level rows
+            try:
+                create_price_quantity_table(name, values_data)
+            except TableSchemaError as e:
+                messages.error(request, "Form data is invalid")
+                return render(request, 'create_table.html', {'error': str(e)}, status=400)
             messages.success(request, "Table created successfully")
             return render(request, 'create_table.html', {'message': 'Data saved successfully!'}, status=201)
 
@@ -388,13 +400,13 @@ class KillActionView(APIView):
 
             # Determine the target order
             order_filter = {'level__id': row_id, 'is_entry': True, 'is_complete': False, 'is_main': True if order_type == 'main' else False}
-            order = Orders.objects.filter(**order_filter).first()
+            order = Orders.objects.filter(**order_filter).select_related('level').first()
 
             if not order:
                 return JsonResponse({'status': 'error', 'message': 'Order not found'}, status=404)
 
-            # Initialize FyersModel
-            fyers = fyersModel.FyersModel(client_id=settings.FYERS_CLIENT_ID, token=access_token, is_async=False, log_path="")
+            # Shared pooled client
+            fyers = get_fyers_client(access_token)
 
             # Exit the position
             data = {"id": order.entry_order_id}
@@ -403,6 +415,7 @@ class KillActionView(APIView):
             # Check Fyers API response
             if response.get('code') == 200:  # Example success check, adapt to actual Fyers API response
                 message = "Order Exited Successfully" if row_id else "Hedging Order Exited Successfully"
+                live_updates.publish(order.level.strategy_id, 'order', {'level': order.level.level_number, 'order_id': order.entry_order_id, 'action': 'exit'})
                 return JsonResponse({'status': 'success', 'message': message}, status=200)
             else:
                 return JsonResponse({'status': 'error', 'message': 'Failed to exit order'}, status=500)
@@ -460,106 +473,202 @@ class CallBackLoginUrl(APIView):
 
 class GetTableDataAPIView(APIView):
     def get(self, request, *args, **kwargs):
-        all_ids = request.GET.get('all_ids', '').split(',') if request.GET.get('all_ids') else []
+        all_ids = _strategy_ids(request)
         static_data = []
 
         if not all_ids:
             return JsonResponse({'static_data': static_data, 'error': 'No strategy IDs provided'}, status=400)
 
         try:
-            for strategy_id in all_ids:
-                cache_key = f"strategy_{strategy_id}"
-                strategy_data = get(cache_key)
-
-                if not strategy_data:
-                    strategy = OrderStrategy.objects.filter(id=strategy_id).first()
-                    if not strategy:
-                        continue
-                    main_order = Orders.objects.filter(level=OuterRef('pk'), is_entry=True, is_complete=False, is_main=True).values('entry_order_id')[:1]
-                    hedging_order = Orders.objects.filter(level=OuterRef('pk'), is_entry=True, is_complete=False, is_main=False).values('entry_order_id')[:1]
-
-                    levels = OrderLevel.objects.filter(strategy=strategy).only(
-                        'main_percentage', 'main_quantity', 'main_target', 'hedging_quantity'
-                    ).annotate(
-                        main_order=Subquery(main_order),
-                        hedging_order=Subquery(hedging_order)
-                    )
-
-                    cumulative_quantity = 0
-                    cumulative_amount = 0
-                    dynamic_h_cum_qty = 0
-                    dynamic_h_cum_amt = 0
-
-                    rows = []
-                    for level in levels:
-                        main_amount = level.main_percentage * level.main_quantity
-                        hedging_qty = level.hedging_quantity or 0
-                        rows.append({
-                            "row_id": level.id,
-                            'static_price': level.main_percentage,
-                            'static_quantity': level.main_quantity,
-                            'static_target': level.main_target,
-                            'static_amount': main_amount,
-                            'static_h_price': random.randint(10, 30),
-                            'static_h_qty': hedging_qty,
-                            'static_h_target': random.randint(10, 30),
-                            'static_h_amount': random.randint(10, 30),
-                            'dynamic_cum_qty': (cumulative_quantity := cumulative_quantity + level.main_quantity),
-                            'dynamic_cum_amt': (cumulative_amount := cumulative_amount + main_amount),
-                            'dynamic_h_cum_qty': (dynamic_h_cum_qty := dynamic_h_cum_qty + hedging_qty),
-                            'dynamic_h_cum_amt': (dynamic_h_cum_amt := dynamic_h_cum_amt + 100),
-                            'dynamic_p_on_r': (level.main_target - level.main_percentage) * level.main_quantity,
-                        })
-
-                    strategy_data = {'id': strategy.id, 'rows': rows}
-                    cache.set(cache_key, strategy_data, timeout=5)  # Cache for 5 seconds
-                static_data.append(strategy_data)
+            strategies_data = static_ladder_cache.get_many(all_ids, self._build_static_data)
+            static_data = [strategies_data[strategy_id] for strategy_id in all_ids if strategy_id in strategies_data]
 
         except Exception as ex:
             return JsonResponse({'static_data': static_data, 'error': 'An error occurred while processing data'}, status=500)
 
         return JsonResponse({'static_data': static_data})
 
+    @staticmethod
+    def _build_static_data(strategy_ids):
+        """Builds the static rows, with their cumulative columns, of the strategies in one level query."""
+        levels = OrderLevel.objects.filter(strategy_id__in=strategy_ids).only(
+            'strategy_id', 'level_number', 'main_percentage', 'main_quantity', 'main_target', 'hedging_quantity'
+        ).order_by('strategy_id', 'level_number')
+
+        levels_by_strategy = defaultdict(list)
+        for level in levels:
+            levels_by_strategy[level.strategy_id].append(level)
+
+        strategies_data = {}
+        for strategy_id in OrderStrategy.objects.filter(id__in=strategy_ids).values_list('id', flat=True):
+            strategy_levels = levels_by_strategy[strategy_id]
+            analytics = LadderAnalytics(strategy_levels)
+            static_amount = analytics.to_list(analytics.amounts)
+            cum_qty = analytics.to_list(analytics.cum_quantity, decimals=0)
+            cum_amt = analytics.to_list(analytics.cum_amount)
+            h_cum_qty = analytics.to_list(analytics.hedging_cum_quantity, decimals=0)
+            p_on_r = analytics.to_list(analytics.payoff_at_target)
+
+            rows = [{
+                "row_id": level.id,
+                'static_price': level.main_percentage,
+                'static_quantity': level.main_quantity,
+                'static_target': level.main_target,
+                'static_amount': static_amount[index],
+                'static_h_price': random.randint(10, 30),
+                'static_h_qty': level.hedging_quantity or 0,
+                'static_h_target': random.randint(10, 30),
+                'static_h_amount': random.randint(10, 30),
+                'dynamic_cum_qty': cum_qty[index],
+                'dynamic_cum_amt': cum_amt[index],
+                'dynamic_h_cum_qty': h_cum_qty[index],
+                'dynamic_h_cum_amt': 100 * (index + 1),
+                'dynamic_p_on_r': p_on_r[index],
+            } for index, level in enumerate(strategy_levels)]
+
+            strategies_data[strategy_id] = {'id': strategy_id, 'rows': rows}
+        return strategies_data
+
+
+def _strategy_ids(request):
+    """Returns the strategy ids of the `all_ids` query parameter."""
+    all_ids = request.GET.get('all_ids', '')
+    return [int(strategy_id) for strategy_id in all_ids.split(',') if strategy_id.strip().isdigit()]
+
+
+def _open_levels(all_ids):
+    """
+    Loads the strategies and, per strategy, the analytics of the levels with an open main order.
+
+    Two queries in total, whatever the number of strategies.
+
+    Returns:
+        tuple: (strategy id to OrderStrategy, strategy id to LadderAnalytics)
+    """
+    strategies = OrderStrategy.objects.in_bulk(all_ids)
+    main_order = Orders.objects.filter(level=OuterRef('pk'), is_entry=True, is_complete=False, is_main=True, entry_order_status=1).values('entry_order_id')[:1]
+    hedging_order = Orders.objects.filter(level=OuterRef('pk'), is_entry=True, is_complete=False, is_main=False, entry_order_status=1).values('entry_order_id')[:1]
+
+    levels = OrderLevel.objects.filter(
+        strategy_id__in=strategies.keys(), main_percentage__isnull=False, main_quantity__isnull=False
+    ).only(
+        'strategy_id', 'level_number', 'main_percentage', 'main_quantity', 'main_target', 'hedging_quantity'
+    ).annotate(
+        main_order=Subquery(main_order),
+        hedging_order=Subquery(hedging_order)
+    ).filter(main_order__isnull=False).order_by('strategy_id', 'level_number')
+
+    levels_by_strategy = defaultdict(list)
+    for level in levels:
+        levels_by_strategy[level.strategy_id].append(level)
+    return strategies, {strategy_id: LadderAnalytics(levels_by_strategy[strategy_id]) for strategy_id in strategies}
+
+
+def _strategy_symbols(strategies):
+    return [symbol for strategy in strategies.values() for symbol in (strategy.main_instrument, strategy.hedging_instrument)]
+
 
 class GetDynamicFieldsAPIView(APIView):
     def get(self, request, *args, **kwargs):
-        access_token = get_access_token()
+        all_ids = _strategy_ids(request)
+        strategies, open_ladders = _open_levels(all_ids)
+
+        # Quotes come from the shared quote feed; only symbols seen for the first time wait for a poll
+        symbols = _strategy_symbols(strategies)
+        quote_feed.subscribe(symbols)
+        quotes = quote_feed.get_many(symbols, timeout=settings.QUOTE_FEED_POLL_INTERVAL)
 
-        all_ids = request.GET.get('all_ids', '')
-        if all_ids:
-            all_ids = all_ids.split(',')  # Split into a list
-        else:
-            all_ids = []  # Default to an empty list
         dynamic_data = []
         for strategy_id in all_ids:
-            strategy = OrderStrategy.objects.filter(id=strategy_id).first()
-            main_order = Orders.objects.filter(level=OuterRef('pk'), is_entry=True, is_complete=False, is_main=True, entry_order_status=1).values('entry_order_id')[:1]
-            hedging_order = Orders.objects.filter(level=OuterRef('pk'), is_entry=True, is_complete=False, is_main=False, entry_order_status=1).values('entry_order_id')[:1]
-
-            levels = OrderLevel.objects.filter(strategy=strategy).only(
-                'main_percentage', 'main_quantity', 'main_target', 'hedging_quantity'
-            ).annotate(
-                main_order=Subquery(main_order),
-                hedging_order=Subquery(hedging_order)
-            )
-
-            data = {
-                "symbols": f"{strategy.main_instrument}, {strategy.hedging_instrument}"
-            }
-            fyers = fyersModel.FyersModel(client_id=settings.FYERS_CLIENT_ID, token=access_token, is_async=False, log_path="")
-            response = fyers.quotes(data=data)
-
-            main_price = response['d'][0]['v']['ask']
-            # hedge_price = response['d'][1]['v']['ask']
-            if strategy:
-                cumulative_pnl = 0
-                dynamic_data.append({
-                    'id': strategy.id,
-                    "rows": [{
-                        'dynamic_pnl': round((main_price - float(_.main_percentage)) * _.main_quantity, 3),
-                        'dynamic_cum_pnl': round((cumulative_pnl := cumulative_pnl + (main_price - float(_.main_percentage)) * _.main_quantity), 3),
-                        # TODO: Find a way to calculate hedging price here
-                        'dynamic_h_pnl': random.randint(3, 30),
-                        'dynamic_h_p_on_r': random.randint(3, 30),
-                    } for _ in levels if _.main_order]})
+            strategy = strategies.get(strategy_id)
+            main_quote = quotes.get(strategy.main_instrument) if strategy else None
+            if not main_quote:
+                continue
+
+            # hedge_price = quotes[strategy.hedging_instrument]['ask']
+            pnl, cumulative_pnl = open_ladders[strategy_id].pnl(main_quote['ask'])
+
+            dynamic_data.append({
+                'id': strategy.id,
+                "rows": [{
+                    'dynamic_pnl': round(float(level_pnl), 3),
+                    'dynamic_cum_pnl': round(float(level_cum_pnl), 3),
+                    # TODO: Find a way to calculate hedging price here
+                    'dynamic_h_pnl': random.randint(3, 30),
+                    'dynamic_h_p_on_r': random.randint(3, 30),
+                } for level_pnl, level_cum_pnl in zip(pnl, cumulative_pnl)]})
         return JsonResponse({'dynamic_data': dynamic_data})
+
+
+class LiveUpdatesStreamView(View):
+    """
+    Server-Sent Events stream of the dashboard's live data.
+
+    Pushes `pnl` events with only the rows whose P&L changed since the last push (checked
+    once per quote feed poll), and `state`/`order` events published by the strategy
+    engine as they happen. The open levels are reloaded only after an engine event, so an
+    idle dashboard costs no queries and no broker calls beyond the shared quote feed.
+
+    A stream ends after `LIVE_UPDATES_STREAM_MAX_AGE` seconds and the browser's EventSource
+    reconnects, so a worker thread is never held by one dashboard indefinitely.
+    """
+    heartbeat_interval = 15
+
+    def get(self, request, *args, **kwargs):
+        all_ids = _strategy_ids(request)
+        response = StreamingHttpResponse(self._stream(all_ids), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+        return response
+
+    @staticmethod
+    def _event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def _stream(self, all_ids):
+        subscription = live_updates.subscribe(all_ids)
+        try:
+            strategies, open_ladders = _open_levels(all_ids)
+            symbols = _strategy_symbols(strategies)
+            sent_rows = {}
+            last_sent = time.monotonic()
+            expires_at = last_sent + settings.LIVE_UPDATES_STREAM_MAX_AGE
+            yield "retry: 3000\n\n"
+
+            while time.monotonic() < expires_at:
+                message = subscription.get(timeout=settings.QUOTE_FEED_POLL_INTERVAL)
+                # The stream outlives the request's connection handling; drop a connection the server closed
+                close_old_connections()
+                if message is not None:
+                    for message in [message] + subscription.drain():
+                        yield self._event(message['event'], {'id': message['id'], **message['data']})
+                    # Orders changed, the set of open levels may have too
+                    strategies, open_ladders = _open_levels(all_ids)
+                    last_sent = time.monotonic()
+
+                quote_feed.subscribe(symbols)
+                quotes = quote_feed.get_many(symbols)
+                for strategy_id in all_ids:
+                    strategy = strategies.get(strategy_id)
+                    main_quote = quotes.get(strategy.main_instrument) if strategy else None
+                    if not main_quote:
+                        continue
+
+                    pnl, cumulative_pnl = open_ladders[strategy_id].pnl(main_quote['ask'])
+                    rows = [(round(float(level_pnl), 3), round(float(level_cum_pnl), 3)) for level_pnl, level_cum_pnl in zip(pnl, cumulative_pnl)]
+                    previous = sent_rows.get(strategy_id, [])
+                    changed = {
+                        index: {'dynamic_pnl': row[0], 'dynamic_cum_pnl': row[1]}
+                        for index, row in enumerate(rows)
+                        if index >= len(previous) or previous[index] != row
+                    }
+                    if changed or len(rows) != len(previous):
+                        sent_rows[strategy_id] = rows
+                        yield self._event('pnl', {'id': strategy_id, 'row_count': len(rows), 'rows': changed})
+                        last_sent = time.monotonic()
+
+                if time.monotonic() - last_sent >= self.heartbeat_interval:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            live_updates.unsubscribe(subscription)
@@ -1,16 +1,19 @@
-import queue
 import threading
 import time
 
 from django.conf import settings
 from fyers_apiv3.FyersWebsocket import order_ws
 
+from accounts.order_dispatcher import OrderDispatcher
+
 
 class FyersWebSocketManager:
-    def __init__(self, access_token, logger, max_retries=5, reconnect_delay=5):
+    def __init__(self, access_token, logger, max_retries=5, reconnect_delay=5, on_order=None, on_trade=None):
         self.access_token = access_token
         self.logger = logger
-        self.q = queue.Queue()
+        self.dispatcher = OrderDispatcher()
+        self.on_order = on_order
+        self.on_trade = on_trade
         self.thread = None
         self.running = False
         self.reconnect_attempts = 0
@@ -19,8 +22,16 @@ class FyersWebSocketManager:
         self.fyers = None
 
     def onOrder(self, message):
-        """Handles incoming WebSocket messages."""
-        self.q.put(message)
+        """Handles incoming WebSocket messages by routing them to the waiting order."""
+        if self.on_order:
+            self.on_order(message)
+        else:
+            self.dispatcher.dispatch(message)
+
+    def onTrade(self, message):
+        """Handles incoming trade messages."""
+        if self.on_trade:
+            self.on_trade(message)
 
     def onError(self, message):
         """Handles WebSocket errors."""
@@ -36,7 +47,7 @@ class FyersWebSocketManager:
         self.logger.info("WebSocket Connected")
         self.reconnect_attempts = 0  # Reset retry counter on successful connection
         try:
-            data_type = "OnOrders"  # Adjust this based on your subscription needs
+            data_type = "OnOrders,OnTrades" if self.on_trade else "OnOrders"
             self.fyers.subscribe(data_type=data_type)
             self.fyers.keep_running()
         except Exception as e:
@@ -66,6 +77,7 @@ class FyersWebSocketManager:
                     on_close=self.onClose,
                     on_error=self.onError,
                     on_orders=self.onOrder,
+                    on_trades=self.onTrade,
                 )
                 self.fyers.connect()
                 break  # Connection successful, exit loop
@@ -99,6 +111,6 @@ class FyersWebSocketManager:
         self.running = False
         if self.fyers:
             try:
-                self.fyers.close()
+                self.fyers.close_connection()
             except Exception as e:
                 self.logger.error(f"Error closing WebSocket: {e}")
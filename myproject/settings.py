@@ -142,9 +142,55 @@ CELERY_BROKER_URL = 'redis://localhost:6379/0'  # or your broker URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
-REDIS_HOST = "localhost"
-REDIS_PORT = 6379
+REDIS_HOST = config('REDIS_HOST', default='')
+REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
+
+# Shared between processes through Redis; without REDIS_HOST each process caches in memory
+if REDIS_HOST:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 
 FYERS_CLIENT_ID = config('CLIENT_ID')
 FYERS_SECRET_KEY = config('CLIENT_SECRET')
+
+# Option chain snapshots are shared between lookups for this many seconds
+OPTION_CHAIN_CACHE_TTL = config('OPTION_CHAIN_CACHE_TTL', default=2.0, cast=float)
+# Minimum strikes fetched per option chain call so different strike distances share a snapshot
+OPTION_CHAIN_MIN_STRIKECOUNT = config('OPTION_CHAIN_MIN_STRIKECOUNT', default=10, cast=int)
+# Local time at which the cached expiry calendar of each index is refreshed
+EXPIRY_CALENDAR_REFRESH_TIME = config('EXPIRY_CALENDAR_REFRESH_TIME', default='09:00')
+# Keep-alive connections kept open per broker host by the shared Fyers client session
+FYERS_HTTP_POOL_SIZE = config('FYERS_HTTP_POOL_SIZE', default=20, cast=int)
+# Seconds between two polls of the shared dashboard quote feed
+QUOTE_FEED_POLL_INTERVAL = config('QUOTE_FEED_POLL_INTERVAL', default=1.0, cast=float)
+# Seconds a symbol stays in the quote feed after the last dashboard asked for it
+QUOTE_FEED_IDLE_TIMEOUT = config('QUOTE_FEED_IDLE_TIMEOUT', default=30.0, cast=float)
+# Quotes older than this many seconds are not served to dashboards
+QUOTE_FEED_MAX_AGE = config('QUOTE_FEED_MAX_AGE', default=10.0, cast=float)
+# Seconds a live updates stream stays open before the dashboard reconnects
+LIVE_UPDATES_STREAM_MAX_AGE = config('LIVE_UPDATES_STREAM_MAX_AGE', default=300, cast=int)
+# Seconds the static dashboard rows of a ladder version are kept; edits invalidate them earlier
+STATIC_LADDER_CACHE_TIMEOUT = config('STATIC_LADDER_CACHE_TIMEOUT', default=86400, cast=int)
+# Largest mark-to-market loss of a ladder position a strategy may arm the next level at (0 disables the check)
+LADDER_MAX_DRAWDOWN = config('LADDER_MAX_DRAWDOWN', default=0, cast=float)
+# Write-behind journal of order changes, replayed into the database on start after a crash
+ORDER_JOURNAL_PATH = config('ORDER_JOURNAL_PATH', default=os.path.join(BASE_DIR, 'order_journal.jsonl'))
+# Seconds the journal writer waits to collect order changes into one database batch
+ORDER_JOURNAL_WRITE_INTERVAL = config('ORDER_JOURNAL_WRITE_INTERVAL', default=0.2, cast=float)
+# Most order changes written to the database in one batch
+ORDER_JOURNAL_BATCH_SIZE = config('ORDER_JOURNAL_BATCH_SIZE', default=500, cast=int)
+# Send orders placed together (e.g. main and hedge legs) as one multi-order request
+FYERS_BASKET_ORDERS = config('FYERS_BASKET_ORDERS', default=True, cast=bool)
+# Seconds to wait for a market order's fill price on the order stream before asking the orderbook
+ORDER_FILL_PRICE_TIMEOUT = config('ORDER_FILL_PRICE_TIMEOUT', default=2.0, cast=float)
@@ -1,14 +1,12 @@
+import functools
 import threading
-import time
 from queue import Queue
 
-from django.conf import settings
-from fyers_apiv3 import fyersModel
-
+from accounts.broker_client import get_fyers_client, rollback_orders, run_broker_calls
 from accounts.logging_setup import get_strategy_logger
 from accounts.models import OrderStrategy, Orders
 from accounts.utils import get_access_token
-from accounts.websocket_handler import FyersWebSocketManager
+from accounts.order_stream import OrderStreamHub
 
 
 class BackgroundProcessor:
@@ -28,14 +26,13 @@ class BackgroundProcessor:
         self.thread.start()  # Start background processing thread
         self.logger = get_strategy_logger(f"Strategy-{self.table_id}")
         self.access_token = get_access_token()
-        self.ws_client = FyersWebSocketManager(self.access_token, self.logger)
-        self.ws_client.start()
+        self.order_dispatcher = OrderStreamHub().subscribe(f"buy-sell-{self.table_id}", self.access_token)
         self.call_instrument = self.strategy.main_instrument
         self.put_instrument = self.strategy.hedging_instrument
         self.stop_event = threading.Event()
         self.first_order_values = None
         self.second_order_values = None
-        self.fyers = fyersModel.FyersModel(client_id=settings.FYERS_CLIENT_ID, token=self.access_token, is_async=False, log_path="")
+        self.fyers = get_fyers_client(self.access_token)
 
         self.logger.info(f"Strategy started for strategy id: {self.strategy.id}")
 
@@ -74,11 +71,12 @@ class BackgroundProcessor:
 
                 self.logger.debug(f'Both clicks received: {self.first_order_values}, {self.second_order_values}')
 
-                first_order = self._process_order(self.first_order_values)
-                second_order = self._process_order(self.second_order_values)
+                placed = self._process_orders(self.first_order_values, self.second_order_values)
 
-                self.logger.debug("Both orders placed. Waiting for confirmation.")
-                self.wait_for_order_confirmation(first_order, second_order)
+                if placed:
+                    first_order, second_order = placed
+                    self.logger.debug("Both orders placed. Waiting for confirmation.")
+                    self.wait_for_order_confirmation(first_order, second_order)
 
             # Mark as completed
             with self.condition:
@@ -88,8 +86,8 @@ class BackgroundProcessor:
 
             self.logger.debug("Processing Completed. Ready for new commands.")
 
-    def _process_order(self, order_values):
-        """Helper function to process a single order."""
+    def _order_request(self, order_values):
+        """Returns the place_order arguments (instrument, quantity, order type, side, price) of a click, or None if it has no price."""
         instrument = self.call_instrument if order_values.get('callPrice') else self.put_instrument
         if order_values.get('callPrice') not in [None, '']:
             quantity = order_values.get('callSellQty') or order_values.get('callBuyQty')
@@ -103,78 +101,50 @@ class BackgroundProcessor:
 
         price = self._round_to_tick_size(price, 0.05)
         side = 1 if order_values.get('action') == 'buy' else -1
+        return instrument, int(quantity), 1, side, float(price)
 
-        order = self.place_order(instrument, quantity=int(quantity), order_type=1, side=side, price=float(price))
-        if order:
-            Orders.objects.create(entry_order_id=order, entry_order_status=2, order_side='buy' if side == 1 else 'sell',
-                                  is_entry=True, order_quantity=quantity, entry_price=price)
-
-        return order
-
-    def _get_message_from_queue(self, first_order, second_order):
+    def _process_orders(self, *orders_values):
         """
-        Helper function to retrieve and identify a message for the specified orders.
+        Places the limit orders of the clicks concurrently and records them once all are accepted.
 
-        Args:
-            first_order (str): Order ID for the entry order.
-            second_order (str): Order ID for the exit order.
+        If any order fails, the accepted ones are cancelled again and nothing is recorded.
 
         Returns:
-            tuple: A tuple (order_id, status, order_type), where `order_type` is either
-                   "entry" or "exit". Returns None if no matching message is found.
+            list or None: Order id per click (None for a click without a price), or None if placement failed.
         """
-        try:
-            # Fetch message from the queue with a timeout
-            message = self.ws_client.q.get(timeout=1)
-            orders = message.get("orders", {})
-
-            # Validate and parse the message structure
-            if message.get("s") != "ok" or orders.get('status') != 2:
-                return None
-
-            # Extract order details
-            order_id = orders.get("id")
-            status = message.get("s")  # This corresponds to the order status
-
-            self.logger.debug(f"Order ID: {order_id} First Order: {first_order}, Second Order: {second_order}")
-
-            # Determine if the message matches the entry or exit order
-            if order_id == first_order:
-                self._clear_queue()
-                self.logger.debug(f'First Order matched {order_id} {first_order}')
-                return order_id, status, "first_order"
-            elif order_id == second_order:
-                self._clear_queue()
-                self.logger.debug(f'Second Order matched {order_id} {second_order}')
-
-                return order_id, status, "second_order"
-            else:
-                self.logger.debug(f"Order ID {order_id} does not match entry or exit order.")
-        except Exception as e:
-            pass
-        return None  # Default return if no matching message is found
+        order_requests = [self._order_request(order_values) for order_values in orders_values]
+        results = run_broker_calls(*[
+            functools.partial(self.place_order, *order_request) if order_request else (lambda: None)
+            for order_request in order_requests
+        ])
+
+        errors = [error for _, error in results if error is not None]
+        if errors:
+            for error in errors:
+                self.logger.error(f"Order placement failed: {error}")
+            rollback_orders(self.fyers, [order_id for order_id, _ in results if order_id], self.logger)
+            return None
 
-    def _clear_queue(self):
-        """
-        Helper function to clear all remaining messages in the queue.
-        """
-        try:
-            while not self.ws_client.q.empty():
-                self.ws_client.q.get_nowait()  # Non-blocking removal of messages
-            self.logger.debug("Queue cleared.")
-        except Exception as e:
-            self.logger.error(f"Error while clearing the queue: {e}")
+        for order_request, (order_id, _) in zip(order_requests, results):
+            if order_id:
+                instrument, quantity, _, side, price = order_request
+                Orders.objects.create(strategy=self.strategy, entry_order_id=order_id, entry_order_status=2, order_side='buy' if side == 1 else 'sell',
+                                      is_entry=True, order_quantity=quantity, entry_price=price)
+        return [order_id for order_id, _ in results]
 
     def wait_for_order_confirmation(self, first_order, second_order):
         """Wait until the status of the specified orders is confirmed."""
 
         while not self.stop_event.is_set():
             try:
-                order_info = self._get_message_from_queue(first_order, second_order)
-                if not order_info:
+                # Woken by the order dispatcher as soon as either order fills
+                fill = self.order_dispatcher.await_any_fill((first_order, second_order), timeout=1)
+                if not fill:
                     continue
 
-                order_id, status, order_type = order_info
+                order_id, _ = fill
+                order_type = "first_order" if order_id == first_order else "second_order"
+                status = "ok"
                 self.logger.info(f"Order confirmed: order_id={order_id}, status={status}, type={order_type}")
 
                 Orders.objects.filter(entry_order_id=order_id).update(entry_order_status=1)
@@ -186,7 +156,7 @@ class BackgroundProcessor:
                     new_order_id = self.place_order(instrument, quantity=int(quantity), order_type=2, side=side)
                     if new_order_id:
                         Orders.objects.create(
-                            entry_order_id=new_order_id, entry_order_status=1, order_side='buy',
+                            strategy=self.strategy, entry_order_id=new_order_id, entry_order_status=1, order_side='buy',
                             is_entry=True, order_quantity=quantity, is_complete=True
                         )
                     self.logger.debug(f"Order {new_order_id} updated to status 1")
@@ -195,9 +165,7 @@ class BackgroundProcessor:
                     self.stop_event.set()
 
             except Exception as e:
-                self.logger.error(f"Unexpected error while retrieving or processing message: {e}")
-            finally:
-                time.sleep(0.1)  # Prevent high CPU usage during polling
+                self.logger.error(f"Unexpected error while waiting for or processing order fill: {e}")
 
     def _get_order_details(self, order_values):
         """Extracts instrument, quantity, and side from order values."""
@@ -305,7 +273,7 @@ class BackgroundProcessor:
                 cancelled_orders.append(response)
             else:
                 orders = Orders.objects.filter(
-                    level__strategy=self.strategy,
+                    strategy=self.strategy,
                     entry_order_status=2,
                     is_complete=False,
                     exit_order_id__isnull=True
@@ -1,3 +1,49 @@
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import Orders
+from accounts.order_dispatcher import OrderDispatcher
+from accounts.order_stream import OrderStreamHub
+from accounts.table_schema import create_price_quantity_table
+from accounts.test_utils import FakeBroker, create_strategy
+
+from .buy_sell_strategy import BackgroundProcessor
+
+
+class ProcessOrdersTests(TestCase):
+    """Checks that the orders of a Buy/Sell click pair are recorded together or not at all."""
+
+    @classmethod
+    def setUpTestData(cls):
+        table = create_price_quantity_table('buy/sell', {'1': {'call_quantity': 1, 'put_quantity': 1}}, table_type='buy_sell')
+        cls.strategy = create_strategy(main_instrument='NSE:CALL', hedging_instrument='NSE:PUT', table=table)
+
+    def make_processor(self, broker):
+        with mock.patch.object(OrderStreamHub, 'subscribe', return_value=OrderDispatcher()), \
+                mock.patch('strategies.buy_sell_strategy.get_fyers_client', return_value=broker), \
+                mock.patch('strategies.buy_sell_strategy.get_access_token', return_value='token'):
+            return BackgroundProcessor(self.strategy.table_id)
+
+    @staticmethod
+    def clicks():
+        return {'callPrice': '100', 'callBuyQty': '75', 'action': 'buy'}, {'putPrice': '90', 'putSellQty': '75', 'action': 'sell'}
+
+    def test_both_orders_are_recorded(self):
+        broker = FakeBroker()
+        processor = self.make_processor(broker)
+
+        order_ids = processor._process_orders(*self.clicks())
+
+        self.assertCountEqual(order_ids, ['order-1', 'order-2'])
+        self.assertCountEqual(Orders.objects.filter(is_complete=False).values_list('entry_order_id', flat=True), order_ids)
+        self.assertEqual(broker.cancelled, [])
+
+    def test_rejected_order_rolls_back_the_other(self):
+        broker = FakeBroker(reject=lambda data: data['symbol'] == 'NSE:PUT')
+        processor = self.make_processor(broker)
+
+        self.assertIsNone(processor._process_orders(*self.clicks()))
+
+        self.assertEqual(broker.cancelled, ['order-1'])
+        self.assertFalse(Orders.objects.filter(is_complete=False).exists())
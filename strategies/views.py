@@ -1,13 +1,14 @@
-import json
 import threading
 
-from django.conf import settings
 from django.shortcuts import render, redirect
-from fyers_apiv3 import fyersModel
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from accounts.broker_client import get_fyers_client
 from accounts.models import PriceQuantityTable, OrderStrategy, Orders
+from accounts.constants import PriceQuantityTableTypeEnum
+from accounts.table_schema import create_price_quantity_table
+from accounts.table_spec import table_spec_cache
 from accounts.utils import get_customer, get_instrument, retry_on_exception, get_access_token
 from strategies.buy_sell_strategy import BackgroundProcessor
 
@@ -21,8 +22,8 @@ class StrategyBuySell(APIView):
     def get(self, request, *args, **kwargs):
         customer = get_customer(request)
         table = PriceQuantityTable.objects.filter(is_active=True).last()
-        data = json.loads(table.price_quantity_data)
-        return render(request, 'strategy_buy_sell.html', {'my_list': data, "customer": customer, "table_id": table.id, 'name': table.name})
+        spec = table_spec_cache.get(table)
+        return render(request, 'strategy_buy_sell.html', {'my_list': spec.levels, "customer": customer, "table_id": table.id, 'name': table.name})
 
     def post(self, request, *args, **kwargs):
         customer = get_customer(request)
@@ -62,8 +63,9 @@ class StrategyBuySell(APIView):
         levels["0"] = {"put_quantity": call_base_quantity, "call_quantity": put_base_quantity, "call_price": round(call_instrument_price, 2), "put_price": round(put_instrument_price, 2)}
 
         sorted_table_data = {k: levels[k] for k in sorted(levels, key=lambda x: int(x), reverse=True)}
-        table = PriceQuantityTable.objects.create(name=table_name, price_quantity_data=json.dumps(sorted_table_data))
-        OrderStrategy.objects.create(user=customer, main_instrument=call_instrument_symbol, hedging_instrument=put_instrument_symbol, table=table)
+        table = create_price_quantity_table(table_name, sorted_table_data, table_type=PriceQuantityTableTypeEnum.BUY_SELL.value)
+        strategy = OrderStrategy.objects.create(user=customer, main_instrument=call_instrument_symbol, hedging_instrument=put_instrument_symbol, table=table)
+        Orders.objects.filter(entry_order_id__in=[call_order_id, put_order_id], strategy__isnull=True).update(strategy=strategy)
         return redirect('strategy_buy_sell')
 
 
@@ -109,7 +111,7 @@ def place_order(instrument, quantity, order_type, side, price=None):
     :return: Order ID if successful, raises an exception otherwise
     """
     access_token = get_access_token()
-    fyers = fyersModel.FyersModel(client_id=settings.FYERS_CLIENT_ID, token=access_token, is_async=False, log_path="")
+    fyers = get_fyers_client(access_token)
 
     # Prepare order data
     order_data = {